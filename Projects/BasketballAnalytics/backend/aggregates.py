@@ -0,0 +1,275 @@
+"""
+Season totals per (player, season) and (team, season), maintained
+incrementally from player_stats so that stats and leaderboard reads never
+scan it.
+
+Every flush that inserts, changes or deletes PlayerStats rows (including
+rows deleted along with their player or game), or moves a player to another
+team, applies the matching deltas to the totals in the same transaction.
+Core writes apply their own changes with apply_stat_changes() (see
+bulk_stats.py); anything else written around the ORM needs
+rebuild_season_totals() afterwards.
+"""
+from sqlalchemy import Float, cast, delete, event, func, insert, inspect, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import Player, PlayerStats, Game, PlayerSeasonTotals, TeamSeasonTotals
+
+# Every summed column in the totals tables
+STAT_COLUMNS = [
+    'points', 'assists', 'rebounds', 'steals', 'blocks', 'turnovers', 'fouls',
+    'field_goals_made', 'field_goals_attempted',
+    'three_pointers_made', 'three_pointers_attempted',
+    'free_throws_made', 'free_throws_attempted',
+    'minutes_played'
+]
+
+# Columns returned as a player's totals
+TOTAL_COLUMNS = [
+    'points', 'assists', 'rebounds', 'steals', 'blocks', 'turnovers',
+    'field_goals_made', 'field_goals_attempted',
+    'three_pointers_made', 'three_pointers_attempted',
+    'minutes_played'
+]
+
+# ========================================
+# MAINTENANCE
+# ========================================
+
+def stat_line(stats, committed=False):
+    """
+    (player_id, game_id, [1, *stats]) for a PlayerStats row, with the values
+    as they are in the database when `committed` is set
+    """
+    state = inspect(stats)
+
+    def value(name):
+        if committed:
+            history = state.attrs[name].history
+            if history.deleted:
+                return history.deleted[0]
+        return getattr(stats, name)
+
+    # Column defaults are only applied on insert, so pending rows may still hold None
+    return value('player_id'), value('game_id'), [1] + [value(name) or 0 for name in STAT_COLUMNS]
+
+def dialect_insert(session, table):
+    """INSERT that supports ON CONFLICT, for PostgreSQL or (in benchmarks) SQLite"""
+    dialect = sqlite if session.get_bind().dialect.name == 'sqlite' else postgresql
+    return dialect.insert(table)
+
+def add_delta(deltas, key, sign, values):
+    current = deltas.setdefault(key, [0] * len(values))
+    for i, v in enumerate(values):
+        current[i] += sign * v
+
+def upsert_totals(session, model, key_names, count_name, deltas):
+    """
+    Adds each delta to its row (creating it if needed) in one statement,
+    then drops rows left without any stat lines
+    """
+    rows = [
+        dict(zip(key_names, key), **dict(zip([count_name] + STAT_COLUMNS, values)))
+        for key, values in deltas.items()
+        if any(values)
+    ]
+    if not rows:
+        return
+
+    table = model.__table__
+    stmt = dialect_insert(session, table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_names,
+        set_={name: table.c[name] + stmt.excluded[name] for name in [count_name] + STAT_COLUMNS}
+    )
+    session.execute(stmt, rows)
+
+    emptied = [key for key, values in deltas.items() if values[0] < 0]
+    if emptied:
+        session.execute(delete(table).where(
+            tuple_(*[table.c[name] for name in key_names]).in_(emptied),
+            table.c[count_name] <= 0
+        ))
+
+@event.listens_for(Session, "before_flush")
+def maintain_season_totals(session, flush_context, instances):
+    changes = []  # (sign, player_id, game_id, values)
+    moves = {}  # player_id -> (old team, new team)
+
+    for obj in session.new:
+        if isinstance(obj, PlayerStats):
+            changes.append((1, *stat_line(obj)))
+    for obj in session.deleted:
+        if isinstance(obj, PlayerStats):
+            changes.append((-1, *stat_line(obj, committed=True)))
+    for obj in session.dirty:
+        if isinstance(obj, PlayerStats) and session.is_modified(obj):
+            changes.append((-1, *stat_line(obj, committed=True)))
+            changes.append((1, *stat_line(obj)))
+        elif isinstance(obj, Player) and obj not in session.deleted:
+            history = inspect(obj).attrs.team.history
+            if history.deleted and history.added and history.deleted[0] != history.added[0]:
+                moves[obj.id] = (history.deleted[0], history.added[0])
+
+    if not changes and not moves:
+        return
+
+    with session.no_autoflush:
+        game_ids = {game_id for _, _, game_id, _ in changes}
+        player_ids = {player_id for _, player_id, _, _ in changes}
+        seasons = dict(session.query(Game.id, Game.season).filter(Game.id.in_(game_ids))) if game_ids else {}
+        teams = dict(session.query(Player.id, Player.team).filter(Player.id.in_(player_ids))) if player_ids else {}
+
+        team_deltas = {}
+
+        # A traded player takes their totals to the new team, as the live GROUP BY did
+        if moves:
+            totals = session.query(PlayerSeasonTotals).filter(PlayerSeasonTotals.player_id.in_(list(moves)))
+            for row in totals:
+                old_team, new_team = moves[row.player_id]
+                values = [row.games_played] + [getattr(row, name) for name in STAT_COLUMNS]
+                add_delta(team_deltas, (old_team, row.season), -1, values)
+                add_delta(team_deltas, (new_team, row.season), 1, values)
+            for player_id, (_, new_team) in moves.items():
+                teams[player_id] = new_team
+
+        apply_stat_changes(session, changes, seasons, teams, team_deltas)
+
+def apply_stat_changes(session, changes, seasons, teams, team_deltas=None):
+    """
+    Folds (sign, player_id, game_id, values) changes into the totals, given
+    each game's season and each player's team
+    """
+    player_deltas = {}
+    team_deltas = {} if team_deltas is None else team_deltas
+    for sign, player_id, game_id, values in changes:
+        season = seasons.get(game_id)
+        team = teams.get(player_id)
+        if season is None or team is None:
+            # The insert itself will fail on the missing game or player
+            continue
+        add_delta(player_deltas, (player_id, season), sign, values)
+        add_delta(team_deltas, (team, season), sign, values)
+
+    upsert_totals(session, PlayerSeasonTotals, ['player_id', 'season'], 'games_played', player_deltas)
+    upsert_totals(session, TeamSeasonTotals, ['team', 'season'], 'stat_lines', team_deltas)
+
+def rebuild_season_totals(db):
+    """
+    Recomputes both tables from player_stats, for rows that were written
+    without going through a Session (bulk loads, psql)
+    """
+    db.execute(delete(TeamSeasonTotals))
+    db.execute(delete(PlayerSeasonTotals))
+
+    per_player = select(
+        PlayerStats.player_id,
+        Game.season,
+        func.count(PlayerStats.id),
+        *[func.coalesce(func.sum(getattr(PlayerStats, name)), 0) for name in STAT_COLUMNS]
+    ).join(Game, Game.id == PlayerStats.game_id).group_by(PlayerStats.player_id, Game.season)
+    db.execute(insert(PlayerSeasonTotals).from_select(
+        ['player_id', 'season', 'games_played'] + STAT_COLUMNS, per_player
+    ))
+
+    per_team = select(
+        Player.team,
+        PlayerSeasonTotals.season,
+        func.sum(PlayerSeasonTotals.games_played),
+        *[func.sum(getattr(PlayerSeasonTotals, name)) for name in STAT_COLUMNS]
+    ).join(Player, Player.id == PlayerSeasonTotals.player_id).group_by(Player.team, PlayerSeasonTotals.season)
+    db.execute(insert(TeamSeasonTotals).from_select(
+        ['team', 'season', 'stat_lines'] + STAT_COLUMNS, per_team
+    ))
+
+# ========================================
+# READS
+# ========================================
+
+def player_totals(db, player_ids, season=None):
+    """
+    Games played and stat totals for each player, read from their season
+    totals. Returns {player_id: (games, totals)}; players without stats are
+    left out.
+    """
+    columns = [func.sum(getattr(PlayerSeasonTotals, name)).label(name) for name in TOTAL_COLUMNS]
+    query = db.query(
+        PlayerSeasonTotals.player_id,
+        func.sum(PlayerSeasonTotals.games_played).label('games'),
+        *columns
+    ).filter(PlayerSeasonTotals.player_id.in_(player_ids))
+
+    if season:
+        query = query.filter(PlayerSeasonTotals.season == season)
+
+    return {
+        row.player_id: (row.games, {name: getattr(row, name) for name in TOTAL_COLUMNS})
+        for row in query.group_by(PlayerSeasonTotals.player_id)
+    }
+
+def stats_summary(total_games, totals):
+    """Response body for a player's stats, from games played and totals"""
+    if not total_games:
+        return {"total_games": 0, "averages": {}}
+
+    averages = {
+        'points': round(totals['points'] / total_games, 1),
+        'assists': round(totals['assists'] / total_games, 1),
+        'rebounds': round(totals['rebounds'] / total_games, 1),
+        'steals': round(totals['steals'] / total_games, 1),
+        'blocks': round(totals['blocks'] / total_games, 1),
+        'turnovers': round(totals['turnovers'] / total_games, 1),
+        'field_goal_pct': round((totals['field_goals_made'] / totals['field_goals_attempted'] * 100), 1) if totals['field_goals_attempted'] > 0 else 0,
+        'three_point_pct': round((totals['three_pointers_made'] / totals['three_pointers_attempted'] * 100), 1) if totals['three_pointers_attempted'] > 0 else 0,
+        'minutes': round(totals['minutes_played'] / total_games, 1)
+    }
+
+    return {
+        "total_games": total_games,
+        "totals": totals,
+        "averages": averages
+    }
+
+def season_leaders(db, stat, limit, season=None):
+    """
+    Players with the highest per-game average of `stat`, as rows of
+    (id, name, team, average, games_played). Within a season this walks the
+    (season, average) index in init.sql, so it reads about `limit` rows.
+    """
+    if season:
+        games = PlayerSeasonTotals.games_played
+        total = getattr(PlayerSeasonTotals, stat)
+    else:
+        games = func.sum(PlayerSeasonTotals.games_played)
+        total = func.sum(getattr(PlayerSeasonTotals, stat))
+    average = cast(total, Float) / games
+
+    query = db.query(
+        Player.id,
+        Player.name,
+        Player.team,
+        average.label('average'),
+        games.label('games_played')
+    ).join(PlayerSeasonTotals, PlayerSeasonTotals.player_id == Player.id)
+
+    if season:
+        query = query.filter(PlayerSeasonTotals.season == season)
+    else:
+        query = query.group_by(Player.id)
+
+    return query.order_by(average.desc()).limit(limit).all()
+
+def team_totals(db, team, season=None):
+    """(stat lines, points, assists, rebounds) summed over the team's seasons"""
+    query = db.query(
+        func.coalesce(func.sum(TeamSeasonTotals.stat_lines), 0).label('stat_lines'),
+        func.coalesce(func.sum(TeamSeasonTotals.points), 0).label('points'),
+        func.coalesce(func.sum(TeamSeasonTotals.assists), 0).label('assists'),
+        func.coalesce(func.sum(TeamSeasonTotals.rebounds), 0).label('rebounds')
+    ).filter(TeamSeasonTotals.team == team)
+
+    if season:
+        query = query.filter(TeamSeasonTotals.season == season)
+
+    return query.one()
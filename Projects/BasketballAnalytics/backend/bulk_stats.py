@@ -0,0 +1,152 @@
+"""
+Bulk loading of player stat lines: a game's box score or a whole season at
+once, as JSON, CSV or NDJSON.
+
+A load checks every player and game id in one query, then inserts all rows
+with multi-row INSERT ... ON CONFLICT (player_id, game_id) DO NOTHING and
+overwrites the lines that already existed. The season totals change in the
+same transaction.
+"""
+import csv
+import io
+import json
+import os
+
+from pydantic import ValidationError
+from sqlalchemy import literal, select, union_all
+
+from models import Player, PlayerStats, Game
+from aggregates import STAT_COLUMNS, apply_stat_changes, dialect_insert
+from schemas import StatsCreate
+
+BULK_STATS_MAX_ROWS = int(os.getenv("BULK_STATS_MAX_ROWS", "100000"))
+
+class MissingReferences(Exception):
+    def __init__(self, player_ids, game_ids):
+        super().__init__("Unknown players or games")
+        self.player_ids = player_ids
+        self.game_ids = game_ids
+
+def parse_rows(body, content_type, game_id=None):
+    """
+    Returns validated StatsCreate rows from a JSON array, CSV with a header
+    row, or NDJSON body. `game_id` fills in rows that leave it out (box
+    scores). Raises ValueError naming the first bad row.
+    """
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    text = body.decode("utf-8-sig")
+
+    if content_type == "text/csv":
+        records = []
+        for i, row in enumerate(csv.DictReader(io.StringIO(text)), start=1):
+            # DictReader puts cells beyond the header under a None key
+            if None in row:
+                raise ValueError(f"Row {i}: more cells than the header has columns")
+            # Empty cells fall back to the schema defaults
+            records.append({k: v for k, v in row.items() if v not in ("", None)})
+    elif content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        records = json.loads(text)
+        if isinstance(records, dict):
+            records = records.get("stats")
+        if not isinstance(records, list):
+            raise ValueError("Expected a JSON array of stat lines (or {\"stats\": [...]})")
+
+    if len(records) > BULK_STATS_MAX_ROWS:
+        raise ValueError(f"At most {BULK_STATS_MAX_ROWS} stat lines per request")
+
+    rows = []
+    for i, record in enumerate(records, start=1):
+        if not isinstance(record, dict):
+            raise ValueError(f"Row {i}: expected an object")
+        if game_id is not None:
+            if record.get("game_id") not in (None, game_id, str(game_id)):
+                raise ValueError(f"Row {i}: game_id does not match the game in the URL")
+            record = {**record, "game_id": game_id}
+        try:
+            rows.append(StatsCreate(**record))
+        except ValidationError as e:
+            error = e.errors()[0]
+            field = ".".join(str(part) for part in error["loc"])
+            raise ValueError(f"Row {i}: {field}: {error['msg']}") from None
+    return rows
+
+def ingest_stats(db, rows):
+    """
+    Upserts the rows and their season totals in the session's transaction
+    (the caller commits). A later row for the same player and game replaces
+    an earlier one. Returns (counts of inserted and updated stat lines,
+    player ids, game ids).
+    """
+    latest = {(row.player_id, row.game_id): row for row in rows}
+    if not latest:
+        return {"received": 0, "inserted": 0, "updated": 0}, set(), set()
+
+    player_ids = {player_id for player_id, _ in latest}
+    game_ids = {game_id for _, game_id in latest}
+
+    # One round-trip validates every reference and fetches what the totals need
+    references = db.execute(union_all(
+        select(literal("player"), Player.id, Player.team).where(Player.id.in_(player_ids)),
+        select(literal("game"), Game.id, Game.season).where(Game.id.in_(game_ids))
+    )).all()
+    teams = {ref_id: value for kind, ref_id, value in references if kind == "player"}
+    seasons = {ref_id: value for kind, ref_id, value in references if kind == "game"}
+    missing_players = sorted(player_ids - teams.keys())
+    missing_games = sorted(game_ids - seasons.keys())
+    if missing_players or missing_games:
+        raise MissingReferences(missing_players, missing_games)
+
+    values = [row.dict() for row in latest.values()]
+    changes = [
+        (1, value["player_id"], value["game_id"], [1] + [value[name] for name in STAT_COLUMNS])
+        for value in values
+    ]
+    table = PlayerStats.__table__
+
+    # RETURNING lists the lines this statement actually inserted, even when another
+    # transaction adds the same line concurrently (the conflict waits for it to commit).
+    # With RETURNING, SQLAlchemy sends the parameter sets as multi-row VALUES pages
+    # ("insertmanyvalues", 1000 rows each) and compiles the statement only once.
+    stmt = dialect_insert(db, table).on_conflict_do_nothing(index_elements=["player_id", "game_id"])
+    inserted = set(map(tuple, db.execute(stmt.returning(table.c.player_id, table.c.game_id), values)))
+    rest = [value for value in values if (value["player_id"], value["game_id"]) not in inserted]
+
+    updated = 0
+    if rest:
+        # The lines being replaced come out of the totals; locking them keeps that exact
+        keys = {(value["player_id"], value["game_id"]) for value in rest}
+        existing = [
+            line for line in db.execute(
+                select(PlayerStats.player_id, PlayerStats.game_id, *[getattr(PlayerStats, name) for name in STAT_COLUMNS])
+                .where(
+                    PlayerStats.game_id.in_({game_id for _, game_id in keys}),
+                    PlayerStats.player_id.in_({player_id for player_id, _ in keys})
+                )
+                .with_for_update()
+            )
+            if (line.player_id, line.game_id) in keys
+        ]
+        changes += [
+            (-1, line.player_id, line.game_id, [1] + [getattr(line, name) or 0 for name in STAT_COLUMNS])
+            for line in existing
+        ]
+        updated = len(existing)
+
+        # Lines deleted since the insert above come back as inserts here
+        stmt = dialect_insert(db, table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["player_id", "game_id"],
+            set_={name: stmt.excluded[name] for name in STAT_COLUMNS}
+        ).returning(table.c.id)
+        db.execute(stmt, rest)
+
+    apply_stat_changes(db, changes, seasons, teams)
+
+    summary = {
+        "received": len(rows),
+        "inserted": len(values) - updated,
+        "updated": updated
+    }
+    return summary, player_ids, game_ids
@@ -0,0 +1,184 @@
+"""
+In-process TTL + LRU cache for GET responses, keyed by path and query
+parameters.
+
+Cached responses carry tags naming the data they were built from
+("players", "player:7", "game:3", ...). Write endpoints invalidate exactly
+those tags once their transaction commits. The TTL only bounds staleness
+for changes made elsewhere, e.g. by another worker process or a raw load.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))  # seconds; 0 disables the cache
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))  # entries
+RESPONSE_CACHE_ETAGS = os.getenv("RESPONSE_CACHE_ETAGS", "true").lower() == "true"
+
+class CacheEntry:
+    __slots__ = ("body", "etag", "headers", "tags", "expires_at")
+
+    def __init__(self, body, etag, headers, tags, expires_at):
+        self.body = body
+        self.etag = etag
+        self.headers = headers
+        self.tags = tags
+        self.expires_at = expires_at
+
+class ResponseCache:
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_SIZE, etags=RESPONSE_CACHE_ETAGS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.etags = etags
+        self.entries = OrderedDict()  # key -> CacheEntry, least recently used first
+        self.tag_keys = {}  # tag -> keys of the entries carrying it
+        self.generation = 0
+        # tag -> generation when it was last invalidated
+        self.invalidated_at = {}
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "not_modified": 0, "stores": 0,
+                         "skipped_stores": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+        self.routes = {}  # route -> [hits, misses]
+
+    # ===== lookups =====
+
+    def key(self, request: Request):
+        query = sorted(request.query_params.multi_items())
+        return request.url.path + ("?" + urlencode(query) if query else "")
+
+    def lookup(self, request: Request):
+        """
+        Returns the cached response for this request (a bodiless 304 when the
+        client's If-None-Match already matches), or None on a miss. A miss
+        remembers the moment on the request, so store() can tell whether a
+        write invalidated the data while it was being read.
+        """
+        if self.ttl <= 0 or request.method != "GET":
+            return None
+
+        key = self.key(request)
+        route = self.route(request)
+        now = time.monotonic()
+        with self.lock:
+            request.state.cache_generation = self.generation
+            entry = self.entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                self._remove(key)
+                self.counters["expirations"] += 1
+                entry = None
+            if entry is None:
+                self.counters["misses"] += 1
+                self.routes.setdefault(route, [0, 0])[1] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters["hits"] += 1
+            self.routes.setdefault(route, [0, 0])[0] += 1
+
+        return self.respond(request, entry.body, entry.etag, entry.headers)
+
+    def store(self, request: Request, payload, tags, headers=None):
+        """
+        Serializes the payload the way the endpoint's JSON response would,
+        caches it (with any extra response headers) under `tags` and returns
+        the response
+        """
+        body = json.dumps(
+            jsonable_encoder(payload),
+            ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+        ).encode("utf-8")
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"' if self.etags else None
+
+        if self.ttl > 0 and request.method == "GET":
+            key = self.key(request)
+            started = getattr(request.state, "cache_generation", -1)
+            with self.lock:
+                # Data read before a write it depends on committed would be stale from the start
+                if any(self.invalidated_at.get(tag, -1) > started for tag in tags):
+                    self.counters["skipped_stores"] += 1
+                else:
+                    if key in self.entries:
+                        self._remove(key)
+                    self.entries[key] = CacheEntry(body, etag, headers, frozenset(tags), time.monotonic() + self.ttl)
+                    for tag in tags:
+                        self.tag_keys.setdefault(tag, set()).add(key)
+                    self.counters["stores"] += 1
+                    while len(self.entries) > self.max_entries:
+                        self._remove(next(iter(self.entries)))
+                        self.counters["evictions"] += 1
+
+        return self.respond(request, body, etag, headers)
+
+    def respond(self, request, body, etag, extra_headers=None):
+        headers = dict(extra_headers) if extra_headers else {}
+        if etag is None:
+            return Response(content=body, media_type="application/json", headers=headers)
+        headers.update({"ETag": etag, "Cache-Control": "no-cache"})
+        if etag in (request.headers.get("if-none-match") or ""):
+            with self.lock:
+                self.counters["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    # ===== invalidation =====
+
+    def invalidate(self, *tags):
+        """Drops every cached response built from any of these tags"""
+        with self.lock:
+            self.generation += 1
+            for tag in tags:
+                self.invalidated_at[tag] = self.generation
+                for key in self.tag_keys.pop(tag, ()):
+                    if key in self.entries:
+                        self._remove(key)
+                        self.counters["invalidations"] += 1
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.tag_keys.clear()
+            self.invalidated_at.clear()
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        for tag in entry.tags:
+            keys = self.tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tag_keys[tag]
+
+    # ===== metrics =====
+
+    @staticmethod
+    def route(request):
+        route = request.scope.get("route")
+        return route.path if route is not None else request.url.path
+
+    def metrics(self):
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": round(self.counters["hits"] / lookups, 3) if lookups else 0.0,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "routes": {
+                    route: {
+                        "hits": hits,
+                        "misses": misses,
+                        "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0
+                    }
+                    for route, (hits, misses) in sorted(self.routes.items())
+                }
+            }
+
+response_cache = ResponseCache()
@@ -1,12 +1,17 @@
-from fastapi import FastAPI, HTTPException, Depends, Query
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 
-from database import get_db, engine, Base, mongodb
+from database import get_async_db, async_engine, Base, mongodb
 from models import Player, PlayerStats, Game
+from aggregates import player_totals, stats_summary, season_leaders, team_totals
+from cache import response_cache
+from bulk_stats import MissingReferences, ingest_stats, parse_rows
+from pagination import PLAYER_FIELDS, PLAYER_KEY, GAME_FIELDS, GAME_KEY, games_page, page_items, players_page, select_fields
 from schemas import (
     PlayerCreate, PlayerResponse, PlayerUpdate,
     StatsCreate, StatsResponse,
@@ -14,14 +19,23 @@ from schemas import (
     GameEventCreate, GameEventResponse
 )
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Upper bound on players in one /api/stats/players request
+MAX_STATS_PLAYERS = 100
+
+@asynccontextmanager
+async def lifespan(app):
+    # Create database tables
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    await async_engine.dispose()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Basketball Platform API",
     description="Simple basketball management system",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -31,6 +45,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 # ========================================
@@ -52,6 +67,7 @@ def read_root():
             "players": "/api/players",
             "games": "/api/games",
             "stats": "/api/stats",
+            "metrics": "/api/metrics",
             "docs": "/docs"
         }
     }
@@ -61,114 +77,96 @@ def read_root():
 # ========================================
 
 @app.post("/api/players", response_model=PlayerResponse, status_code=201)
-def create_player(player: PlayerCreate, db: Session = Depends(get_db)):
+async def create_player(player: PlayerCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new player"""
     db_player = Player(**player.dict())
     db.add(db_player)
-    db.commit()
-    db.refresh(db_player)
+    await db.commit()
+    await db.refresh(db_player)
+    response_cache.invalidate("players")
     return db_player
 
 @app.get("/api/players", response_model=List[PlayerResponse])
-def get_players(
+async def get_players(
+    request: Request,
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, le=1000),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     team: Optional[str] = None,
     position: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all players with optional filters"""
-    query = db.query(Player)
-    
-    if team:
-        query = query.filter(Player.team == team)
-    if position:
-        query = query.filter(Player.position == position)
-    
-    players = query.offset(skip).limit(limit).all()
-    return players
+    """
+    Get all players with optional filters, in id order. When there are more,
+    the X-Next-Cursor header holds the `cursor` for the next page. `fields`
+    (e.g. "id,name,team") limits the columns returned.
+    """
+    cached = response_cache.lookup(request)
+    if cached:
+        return cached
+    
+    try:
+        columns = select_fields(fields, PLAYER_FIELDS)
+        query = players_page(columns, limit, cursor, skip, team, position)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    rows = (await db.execute(query)).all()
+    players, next_cursor = page_items(rows, columns, PLAYER_KEY, limit)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return response_cache.store(request, players, ["players"], headers)
 
 @app.get("/api/players/{player_id}", response_model=PlayerResponse)
-def get_player(player_id: int, db: Session = Depends(get_db)):
+async def get_player(request: Request, player_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get player by ID"""
-    player = db.query(Player).filter(Player.id == player_id).first()
+    cached = response_cache.lookup(request)
+    if cached:
+        return cached
+    
+    player = await db.get(Player, player_id)
     if not player:
         raise HTTPException(status_code=404, detail="Player not found")
-    return player
+    return response_cache.store(request, PlayerResponse.model_validate(player), [f"player:{player_id}"])
 
 @app.put("/api/players/{player_id}", response_model=PlayerResponse)
-def update_player(player_id: int, player_update: PlayerUpdate, db: Session = Depends(get_db)):
+async def update_player(player_id: int, player_update: PlayerUpdate, db: AsyncSession = Depends(get_async_db)):
     """Update player information"""
-    player = db.query(Player).filter(Player.id == player_id).first()
+    player = await db.get(Player, player_id)
     if not player:
         raise HTTPException(status_code=404, detail="Player not found")
     
     for key, value in player_update.dict(exclude_unset=True).items():
         setattr(player, key, value)
     
-    db.commit()
-    db.refresh(player)
+    await db.commit()
+    await db.refresh(player)
+    # Names and teams also show up in box scores and leaderboards
+    response_cache.invalidate("players", f"player:{player_id}", "leaderboards")
     return player
 
 @app.delete("/api/players/{player_id}")
-def delete_player(player_id: int, db: Session = Depends(get_db)):
+async def delete_player(player_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete player"""
-    player = db.query(Player).filter(Player.id == player_id).first()
+    player = await db.get(Player, player_id)
     if not player:
         raise HTTPException(status_code=404, detail="Player not found")
     
-    db.delete(player)
-    db.commit()
+    await db.delete(player)
+    await db.commit()
+    response_cache.invalidate("players", f"player:{player_id}", "leaderboards")
     return {"message": "Player deleted successfully"}
 
 @app.get("/api/players/{player_id}/stats")
-def get_player_stats(player_id: int, season: Optional[str] = None, db: Session = Depends(get_db)):
+async def get_player_stats(request: Request, player_id: int, season: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
     """Get player statistics"""
-    query = db.query(PlayerStats).filter(PlayerStats.player_id == player_id)
-    
-    if season:
-        query = query.join(Game).filter(Game.season == season)
-    
-    stats = query.all()
-    
-    if not stats:
-        return {"total_games": 0, "averages": {}}
-    
-    total_games = len(stats)
-    
-    # Calculate totals
-    totals = {
-        'points': sum(s.points for s in stats),
-        'assists': sum(s.assists for s in stats),
-        'rebounds': sum(s.rebounds for s in stats),
-        'steals': sum(s.steals for s in stats),
-        'blocks': sum(s.blocks for s in stats),
-        'turnovers': sum(s.turnovers for s in stats),
-        'field_goals_made': sum(s.field_goals_made for s in stats),
-        'field_goals_attempted': sum(s.field_goals_attempted for s in stats),
-        'three_pointers_made': sum(s.three_pointers_made for s in stats),
-        'three_pointers_attempted': sum(s.three_pointers_attempted for s in stats),
-        'minutes_played': sum(s.minutes_played for s in stats)
-    }
-    
-    # Calculate averages
-    averages = {
-        'points': round(totals['points'] / total_games, 1),
-        'assists': round(totals['assists'] / total_games, 1),
-        'rebounds': round(totals['rebounds'] / total_games, 1),
-        'steals': round(totals['steals'] / total_games, 1),
-        'blocks': round(totals['blocks'] / total_games, 1),
-        'turnovers': round(totals['turnovers'] / total_games, 1),
-        'field_goal_pct': round((totals['field_goals_made'] / totals['field_goals_attempted'] * 100), 1) if totals['field_goals_attempted'] > 0 else 0,
-        'three_point_pct': round((totals['three_pointers_made'] / totals['three_pointers_attempted'] * 100), 1) if totals['three_pointers_attempted'] > 0 else 0,
-        'minutes': round(totals['minutes_played'] / total_games, 1)
-    }
+    cached = response_cache.lookup(request)
+    if cached:
+        return cached
     
-    return {
-        "total_games": total_games,
-        "totals": totals,
-        "averages": averages
-    }
+    results = await db.run_sync(player_totals, [player_id], season)
+    total_games, totals = results.get(player_id, (0, None))
+    return response_cache.store(request, stats_summary(total_games, totals), [f"player:{player_id}"])
 
 @app.get("/api/players/{player_id}/similar")
 async def find_similar_players(player_id: int, top_k: int = 5):
@@ -184,96 +182,151 @@ async def find_similar_players(player_id: int, top_k: int = 5):
 # ========================================
 
 @app.post("/api/games", response_model=GameResponse, status_code=201)
-def create_game(game: GameCreate, db: Session = Depends(get_db)):
+async def create_game(game: GameCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new game"""
     db_game = Game(**game.dict(), status="scheduled")
     db.add(db_game)
-    db.commit()
-    db.refresh(db_game)
+    await db.commit()
+    await db.refresh(db_game)
+    response_cache.invalidate("games")
     return db_game
 
 @app.get("/api/games", response_model=List[GameResponse])
-def get_games(
+async def get_games(
+    request: Request,
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, le=1000),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
     season: Optional[str] = None,
     status: Optional[str] = None,
     team: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all games with optional filters"""
-    query = db.query(Game)
-    
-    if season:
-        query = query.filter(Game.season == season)
-    if status:
-        query = query.filter(Game.status == status)
-    if team:
-        query = query.filter((Game.home_team == team) | (Game.away_team == team))
-    
-    games = query.order_by(Game.game_date.desc()).offset(skip).limit(limit).all()
-    return games
+    """
+    Get all games with optional filters, newest first. When there are more,
+    the X-Next-Cursor header holds the `cursor` for the next page. `fields`
+    (e.g. "id,game_date,home_team,away_team") limits the columns returned.
+    """
+    cached = response_cache.lookup(request)
+    if cached:
+        return cached
+    
+    try:
+        columns = select_fields(fields, GAME_FIELDS)
+        query = games_page(columns, limit, cursor, skip, season, status, team)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    rows = (await db.execute(query)).all()
+    games, next_cursor = page_items(rows, columns, GAME_KEY, limit)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return response_cache.store(request, games, ["games"], headers)
 
 @app.get("/api/games/{game_id}", response_model=GameResponse)
-def get_game(game_id: int, db: Session = Depends(get_db)):
+async def get_game(request: Request, game_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get game by ID"""
-    game = db.query(Game).filter(Game.id == game_id).first()
+    cached = response_cache.lookup(request)
+    if cached:
+        return cached
+    
+    game = await db.get(Game, game_id)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
-    return game
+    return response_cache.store(request, GameResponse.model_validate(game), [f"game:{game_id}"])
 
 @app.put("/api/games/{game_id}", response_model=GameResponse)
-def update_game(game_id: int, game_update: GameUpdate, db: Session = Depends(get_db)):
+async def update_game(game_id: int, game_update: GameUpdate, db: AsyncSession = Depends(get_async_db)):
     """Update game information"""
-    game = db.query(Game).filter(Game.id == game_id).first()
+    game = await db.get(Game, game_id)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
     
     for key, value in game_update.dict(exclude_unset=True).items():
         setattr(game, key, value)
     
-    db.commit()
-    db.refresh(game)
+    await db.commit()
+    await db.refresh(game)
+    response_cache.invalidate("games", f"game:{game_id}")
     return game
 
 @app.delete("/api/games/{game_id}")
-def delete_game(game_id: int, db: Session = Depends(get_db)):
+async def delete_game(game_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete game"""
-    game = db.query(Game).filter(Game.id == game_id).first()
+    game = await db.get(Game, game_id)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
     
-    db.delete(game)
-    db.commit()
+    # Everyone who played in it loses a game from their stats
+    player_ids = await db.scalars(select(PlayerStats.player_id).where(PlayerStats.game_id == game_id))
+    player_tags = [f"player:{player_id}" for player_id in player_ids]
+    
+    await db.delete(game)
+    await db.commit()
+    response_cache.invalidate("games", f"game:{game_id}", "leaderboards", *player_tags)
     return {"message": "Game deleted successfully"}
 
 @app.post("/api/games/{game_id}/stats", response_model=StatsResponse, status_code=201)
-def add_game_stats(game_id: int, stats: StatsCreate, db: Session = Depends(get_db)):
+async def add_game_stats(game_id: int, stats: StatsCreate, db: AsyncSession = Depends(get_async_db)):
     """Add player stats for a game"""
     # Verify game exists
-    game = db.query(Game).filter(Game.id == game_id).first()
+    game = await db.get(Game, game_id)
     if not game:
         raise HTTPException(status_code=404, detail="Game not found")
     
     # Verify player exists
-    player = db.query(Player).filter(Player.id == stats.player_id).first()
+    player = await db.get(Player, stats.player_id)
     if not player:
         raise HTTPException(status_code=404, detail="Player not found")
     
     db_stats = PlayerStats(**stats.dict())
     db.add(db_stats)
-    db.commit()
-    db.refresh(db_stats)
+    await db.commit()
+    await db.refresh(db_stats)
+    response_cache.invalidate(f"game:{game_id}", f"game:{stats.game_id}", f"player:{stats.player_id}", "leaderboards")
     return db_stats
 
+async def load_stats(request: Request, db: AsyncSession, game_id: Optional[int] = None):
+    """Parses a bulk stats body and upserts it with the season totals in one transaction"""
+    try:
+        rows = parse_rows(await request.body(), request.headers.get("content-type"), game_id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    try:
+        summary, player_ids, game_ids = await db.run_sync(ingest_stats, rows)
+    except MissingReferences as e:
+        raise HTTPException(status_code=404, detail={
+            "message": "Unknown players or games",
+            "player_ids": e.player_ids,
+            "game_ids": e.game_ids
+        })
+    await db.commit()
+    
+    response_cache.invalidate(
+        "leaderboards",
+        *[f"game:{i}" for i in game_ids],
+        *[f"player:{i}" for i in player_ids]
+    )
+    return summary
+
+@app.post("/api/games/{game_id}/stats/bulk")
+async def add_box_score(game_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Add or replace a game's whole box score (JSON array, CSV or NDJSON; game_id may be omitted)"""
+    return await load_stats(request, db, game_id)
+
 @app.get("/api/games/{game_id}/stats")
-def get_game_stats(game_id: int, db: Session = Depends(get_db)):
+async def get_game_stats(request: Request, game_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get all player stats for a game"""
-    stats = db.query(PlayerStats, Player.name).join(Player).filter(
+    cached = response_cache.lookup(request)
+    if cached:
+        return cached
+    
+    stats = (await db.execute(select(PlayerStats, Player.name).join(Player).where(
         PlayerStats.game_id == game_id
-    ).all()
+    ))).all()
     
-    return [
+    box_score = [
         {
             "player_name": player_name,
             "points": stat.points,
@@ -289,6 +342,8 @@ def get_game_stats(game_id: int, db: Session = Depends(get_db)):
         }
         for stat, player_name in stats
     ]
+    tags = [f"game:{game_id}"] + [f"player:{stat.player_id}" for stat, _ in stats]
+    return response_cache.store(request, box_score, tags)
 
 # ========================================
 # GAME EVENTS (MongoDB)
@@ -326,95 +381,106 @@ async def get_game_events(game_id: int):
 # BASIC STATISTICS ENDPOINTS
 # ========================================
 
+@app.post("/api/stats/bulk")
+async def load_season_stats(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Add or replace stat lines for any games, e.g. a season backfill (JSON array, CSV or NDJSON)"""
+    return await load_stats(request, db)
+
 @app.get("/api/stats/top-scorers")
-def get_top_scorers(limit: int = Query(10, le=50), season: Optional[str] = None, db: Session = Depends(get_db)):
+async def get_top_scorers(request: Request, limit: int = Query(10, le=50), season: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
     """Get top scorers"""
-    query = db.query(
-        Player.id,
-        Player.name,
-        Player.team,
-        func.avg(PlayerStats.points).label('avg_points'),
-        func.count(PlayerStats.id).label('games_played')
-    ).join(PlayerStats)
-    
-    if season:
-        query = query.join(Game).filter(Game.season == season)
-    
-    results = query.group_by(Player.id).order_by(
-        func.avg(PlayerStats.points).desc()
-    ).limit(limit).all()
-    
-    return [
+    cached = response_cache.lookup(request)
+    if cached:
+        return cached
+    
+    results = await db.run_sync(season_leaders, 'points', limit, season)
+    
+    return response_cache.store(request, [
         {
             'player_id': r.id,
             'name': r.name,
             'team': r.team,
-            'avg_points': round(r.avg_points, 1),
+            'avg_points': round(r.average, 1),
             'games_played': r.games_played
         }
         for r in results
-    ]
+    ], ["leaderboards"])
+
+@app.get("/api/stats/players")
+async def get_players_stats(
+    request: Request,
+    player_ids: List[int] = Query(..., alias="player_id"),
+    season: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get statistics for several players at once (?player_id=1&player_id=2)"""
+    if len(player_ids) > MAX_STATS_PLAYERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_STATS_PLAYERS} players per request")
+    
+    cached = response_cache.lookup(request)
+    if cached:
+        return cached
+    
+    results = await db.run_sync(player_totals, player_ids, season)
+    return response_cache.store(request, [
+        {"player_id": player_id, **stats_summary(*results.get(player_id, (0, None)))}
+        for player_id in dict.fromkeys(player_ids)
+    ], ["leaderboards"])
 
 @app.get("/api/stats/team")
-def get_team_stats(team: str, season: Optional[str] = None, db: Session = Depends(get_db)):
+async def get_team_stats(request: Request, team: str, season: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
     """Get aggregated stats for a team"""
-    query = db.query(
-        func.avg(PlayerStats.points).label('avg_points'),
-        func.avg(PlayerStats.assists).label('avg_assists'),
-        func.avg(PlayerStats.rebounds).label('avg_rebounds'),
-        func.count(PlayerStats.id).label('total_games')
-    ).join(Player).filter(Player.team == team)
-    
-    if season:
-        query = query.join(Game).filter(Game.season == season)
+    cached = response_cache.lookup(request)
+    if cached:
+        return cached
     
-    results = query.first()
+    results = await db.run_sync(team_totals, team, season)
     
-    if not results or results.total_games == 0:
+    if results.stat_lines == 0:
         raise HTTPException(status_code=404, detail="No data found for team")
     
-    return {
+    return response_cache.store(request, {
         'team': team,
         'season': season if season else 'all',
-        'avg_points': round(results.avg_points or 0, 1),
-        'avg_assists': round(results.avg_assists or 0, 1),
-        'avg_rebounds': round(results.avg_rebounds or 0, 1),
-        'total_games': results.total_games
-    }
+        'avg_points': round(results.points / results.stat_lines, 1),
+        'avg_assists': round(results.assists / results.stat_lines, 1),
+        'avg_rebounds': round(results.rebounds / results.stat_lines, 1),
+        'total_games': results.stat_lines
+    }, ["leaderboards"])
 
 @app.get("/api/stats/leaderboard")
-def get_leaderboard(
+async def get_leaderboard(
+    request: Request,
     stat: str = Query("points", regex="^(points|assists|rebounds|steals|blocks)$"),
     limit: int = Query(10, le=50),
     season: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get leaderboard for any stat"""
-    stat_column = getattr(PlayerStats, stat)
-    
-    query = db.query(
-        Player.name,
-        Player.team,
-        func.avg(stat_column).label(f'avg_{stat}'),
-        func.count(PlayerStats.id).label('games_played')
-    ).join(PlayerStats).join(Game)
+    cached = response_cache.lookup(request)
+    if cached:
+        return cached
     
-    if season:
-        query = query.filter(Game.season == season)
+    results = await db.run_sync(season_leaders, stat, limit, season)
     
-    results = query.group_by(Player.id).order_by(
-        func.avg(stat_column).desc()
-    ).limit(limit).all()
-    
-    return [
+    return response_cache.store(request, [
         {
             'name': r.name,
             'team': r.team,
-            f'avg_{stat}': round(getattr(r, f'avg_{stat}'), 1),
+            f'avg_{stat}': round(r.average, 1),
             'games_played': r.games_played
         }
         for r in results
-    ]
+    ], ["leaderboards"])
+
+# ========================================
+# METRICS
+# ========================================
+
+@app.get("/api/metrics")
+def get_metrics():
+    """Response cache hit rates, overall and per route"""
+    return {"response_cache": response_cache.metrics()}
 
 # ========================================
 # HEALTH CHECK
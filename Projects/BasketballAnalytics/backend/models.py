@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Index, UniqueConstraint, desc
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -18,6 +18,8 @@ class Player(Base):
 
 class Game(Base):
     __tablename__ = "games"
+    # Newest-first keyset pages (see pagination.py) walk this index
+    __table_args__ = (Index("idx_games_date", desc("game_date"), desc("id")),)
     
     id = Column(Integer, primary_key=True, index=True)
     home_team = Column(String, nullable=False)
@@ -32,6 +34,8 @@ class Game(Base):
 
 class PlayerStats(Base):
     __tablename__ = "player_stats"
+    # One stat line per player per game; bulk loads upsert on it
+    __table_args__ = (UniqueConstraint("player_id", "game_id", name="unique_player_game"),)
     
     id = Column(Integer, primary_key=True, index=True)
     player_id = Column(Integer, ForeignKey("players.id"), nullable=False)
@@ -55,4 +59,38 @@ class PlayerStats(Base):
     minutes_played = Column(Float, default=0)
     
     player = relationship("Player", back_populates="stats")
-    game = relationship("Game", back_populates="stats")
\ No newline at end of file
+    game = relationship("Game", back_populates="stats")
+
+class SeasonTotalsMixin:
+    """Summed stat columns shared by the season totals tables"""
+    points = Column(Integer, nullable=False, default=0)
+    assists = Column(Integer, nullable=False, default=0)
+    rebounds = Column(Integer, nullable=False, default=0)
+    steals = Column(Integer, nullable=False, default=0)
+    blocks = Column(Integer, nullable=False, default=0)
+    turnovers = Column(Integer, nullable=False, default=0)
+    fouls = Column(Integer, nullable=False, default=0)
+
+    field_goals_made = Column(Integer, nullable=False, default=0)
+    field_goals_attempted = Column(Integer, nullable=False, default=0)
+    three_pointers_made = Column(Integer, nullable=False, default=0)
+    three_pointers_attempted = Column(Integer, nullable=False, default=0)
+    free_throws_made = Column(Integer, nullable=False, default=0)
+    free_throws_attempted = Column(Integer, nullable=False, default=0)
+
+    minutes_played = Column(Float, nullable=False, default=0)
+
+# Maintained from player_stats by aggregates.py; never written directly
+class PlayerSeasonTotals(SeasonTotalsMixin, Base):
+    __tablename__ = "player_season_totals"
+    
+    player_id = Column(Integer, ForeignKey("players.id", ondelete="CASCADE"), primary_key=True)
+    season = Column(String, primary_key=True)
+    games_played = Column(Integer, nullable=False, default=0)
+
+class TeamSeasonTotals(SeasonTotalsMixin, Base):
+    __tablename__ = "team_season_totals"
+    
+    team = Column(String, primary_key=True)
+    season = Column(String, primary_key=True)
+    stat_lines = Column(Integer, nullable=False, default=0)  # one per player per game
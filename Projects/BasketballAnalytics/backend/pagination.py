@@ -0,0 +1,115 @@
+"""
+Keyset pagination and column projections for the list endpoints.
+
+Pages are read with WHERE (sort key) > (last row's key) instead of OFFSET,
+so a deep page costs the same as the first one. The key of a page's last
+row goes back to the client as an opaque cursor (the X-Next-Cursor header).
+Rows are fetched as plain column tuples, without building ORM objects or
+validating each one through Pydantic.
+"""
+import base64
+import json
+from datetime import date
+
+from sqlalchemy import select, tuple_
+
+from models import Player, Game
+from schemas import PlayerResponse, GameResponse
+
+# Response fields in the order the full schemas return them
+PLAYER_FIELDS = list(PlayerResponse.model_fields)
+GAME_FIELDS = list(GameResponse.model_fields)
+
+def encode_cursor(values):
+    data = json.dumps(values, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def decode_cursor(cursor, types):
+    """
+    Returns the cursor's values converted with `types` (one callable per
+    value). Raises ValueError for anything this module did not produce.
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(data)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor") from None
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Invalid cursor")
+    try:
+        return [convert(value) for convert, value in zip(types, values)]
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor") from None
+
+def select_fields(fields, allowed):
+    """
+    Field names from a comma-separated `fields` parameter (all of `allowed`
+    when it is empty), in the schema's order. Raises ValueError on unknown
+    names.
+    """
+    if not fields:
+        return list(allowed)
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}. Choose from: {', '.join(allowed)}")
+    return [name for name in allowed if name in requested]
+
+def page_query(model, fields, key_names):
+    """SELECT of the requested columns, followed by any sort key columns not among them"""
+    names = fields + [name for name in key_names if name not in fields]
+    return select(*[getattr(model, name) for name in names])
+
+def page_items(rows, fields, key_names, limit):
+    """
+    Turns up to limit + 1 fetched rows into (items, next cursor). The extra
+    row only tells whether another page exists.
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [dict(zip(fields, row)) for row in rows]
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]._mapping
+        next_cursor = encode_cursor([last[name] for name in key_names])
+    return items, next_cursor
+
+# ===== players: ordered by id =====
+
+PLAYER_KEY = ["id"]
+
+def players_page(fields, limit, cursor=None, skip=0, team=None, position=None):
+    query = page_query(Player, fields, PLAYER_KEY)
+
+    if team:
+        query = query.where(Player.team == team)
+    if position:
+        query = query.where(Player.position == position)
+
+    if cursor:
+        (last_id,) = decode_cursor(cursor, [int])
+        query = query.where(Player.id > last_id)
+    else:
+        query = query.offset(skip)
+    return query.order_by(Player.id).limit(limit + 1)
+
+# ===== games: newest first, ordered by (game_date, id) =====
+
+GAME_KEY = ["game_date", "id"]
+
+def games_page(fields, limit, cursor=None, skip=0, season=None, status=None, team=None):
+    query = page_query(Game, fields, GAME_KEY)
+
+    if season:
+        query = query.where(Game.season == season)
+    if status:
+        query = query.where(Game.status == status)
+    if team:
+        query = query.where((Game.home_team == team) | (Game.away_team == team))
+
+    if cursor:
+        last_date, last_id = decode_cursor(cursor, [date.fromisoformat, int])
+        query = query.where(tuple_(Game.game_date, Game.id) < (last_date, last_id))
+    else:
+        query = query.offset(skip)
+    return query.order_by(Game.game_date.desc(), Game.id.desc()).limit(limit + 1)
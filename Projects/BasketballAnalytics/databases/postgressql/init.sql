@@ -1,5 +1,7 @@
 \c basketball_db;
 
+DROP TABLE IF EXISTS team_season_totals CASCADE;
+DROP TABLE IF EXISTS player_season_totals CASCADE;
 DROP TABLE IF EXISTS player_stats CASCADE;
 DROP TABLE IF EXISTS games CASCADE;
 DROP TABLE IF EXISTS players CASCADE;
@@ -62,13 +64,69 @@ CREATE TABLE player_stats (
     CONSTRAINT unique_player_game UNIQUE (player_id, game_id)
 );
 
+-- Season Totals Tables
+-- Running totals maintained by the API (backend/aggregates.py) in the same
+-- transaction as every player_stats write; after loading player_stats by
+-- other means, run SELECT refresh_season_totals();
+CREATE TABLE player_season_totals (
+    player_id INTEGER NOT NULL REFERENCES players(id) ON DELETE CASCADE,
+    season VARCHAR(20) NOT NULL,
+    games_played INTEGER NOT NULL DEFAULT 0,
+    
+    points INTEGER NOT NULL DEFAULT 0,
+    assists INTEGER NOT NULL DEFAULT 0,
+    rebounds INTEGER NOT NULL DEFAULT 0,
+    steals INTEGER NOT NULL DEFAULT 0,
+    blocks INTEGER NOT NULL DEFAULT 0,
+    turnovers INTEGER NOT NULL DEFAULT 0,
+    fouls INTEGER NOT NULL DEFAULT 0,
+
+    field_goals_made INTEGER NOT NULL DEFAULT 0,
+    field_goals_attempted INTEGER NOT NULL DEFAULT 0,
+    three_pointers_made INTEGER NOT NULL DEFAULT 0,
+    three_pointers_attempted INTEGER NOT NULL DEFAULT 0,
+    free_throws_made INTEGER NOT NULL DEFAULT 0,
+    free_throws_attempted INTEGER NOT NULL DEFAULT 0,
+    
+    minutes_played FLOAT NOT NULL DEFAULT 0,
+    
+    PRIMARY KEY (player_id, season)
+);
+
+-- Team totals follow each player's current team, like the player_stats join did
+CREATE TABLE team_season_totals (
+    team VARCHAR(100) NOT NULL,
+    season VARCHAR(20) NOT NULL,
+    stat_lines INTEGER NOT NULL DEFAULT 0,
+    
+    points INTEGER NOT NULL DEFAULT 0,
+    assists INTEGER NOT NULL DEFAULT 0,
+    rebounds INTEGER NOT NULL DEFAULT 0,
+    steals INTEGER NOT NULL DEFAULT 0,
+    blocks INTEGER NOT NULL DEFAULT 0,
+    turnovers INTEGER NOT NULL DEFAULT 0,
+    fouls INTEGER NOT NULL DEFAULT 0,
+
+    field_goals_made INTEGER NOT NULL DEFAULT 0,
+    field_goals_attempted INTEGER NOT NULL DEFAULT 0,
+    three_pointers_made INTEGER NOT NULL DEFAULT 0,
+    three_pointers_attempted INTEGER NOT NULL DEFAULT 0,
+    free_throws_made INTEGER NOT NULL DEFAULT 0,
+    free_throws_attempted INTEGER NOT NULL DEFAULT 0,
+    
+    minutes_played FLOAT NOT NULL DEFAULT 0,
+    
+    PRIMARY KEY (team, season)
+);
+
 -- Player indexes
 CREATE INDEX idx_players_name ON players(name);
 CREATE INDEX idx_players_team ON players(team);
 CREATE INDEX idx_players_position ON players(position);
 
 -- Game indexes
-CREATE INDEX idx_games_date ON games(game_date);
+-- Newest-first keyset pages walk this index: WHERE (game_date, id) < (...) ORDER BY game_date DESC, id DESC
+CREATE INDEX idx_games_date ON games(game_date DESC, id DESC);
 CREATE INDEX idx_games_season ON games(season);
 CREATE INDEX idx_games_status ON games(status);
 CREATE INDEX idx_games_home_team ON games(home_team);
@@ -79,6 +137,55 @@ CREATE INDEX idx_stats_player ON player_stats(player_id);
 CREATE INDEX idx_stats_game ON player_stats(game_id);
 CREATE INDEX idx_stats_points ON player_stats(points);
 
+-- Season leaderboard indexes (same expression as aggregates.season_leaders)
+CREATE INDEX idx_season_totals_avg_points ON player_season_totals (season, (points::FLOAT / games_played) DESC);
+CREATE INDEX idx_season_totals_avg_assists ON player_season_totals (season, (assists::FLOAT / games_played) DESC);
+CREATE INDEX idx_season_totals_avg_rebounds ON player_season_totals (season, (rebounds::FLOAT / games_played) DESC);
+CREATE INDEX idx_season_totals_avg_steals ON player_season_totals (season, (steals::FLOAT / games_played) DESC);
+CREATE INDEX idx_season_totals_avg_blocks ON player_season_totals (season, (blocks::FLOAT / games_played) DESC);
+
+-- Rebuild Season Totals
+CREATE OR REPLACE FUNCTION refresh_season_totals() RETURNS void AS $$
+    DELETE FROM team_season_totals;
+    DELETE FROM player_season_totals;
+    
+    INSERT INTO player_season_totals (
+        player_id, season, games_played,
+        points, assists, rebounds, steals, blocks, turnovers, fouls,
+        field_goals_made, field_goals_attempted, three_pointers_made, three_pointers_attempted,
+        free_throws_made, free_throws_attempted, minutes_played
+    )
+    SELECT 
+        ps.player_id, g.season, COUNT(ps.id),
+        COALESCE(SUM(ps.points), 0), COALESCE(SUM(ps.assists), 0), COALESCE(SUM(ps.rebounds), 0),
+        COALESCE(SUM(ps.steals), 0), COALESCE(SUM(ps.blocks), 0), COALESCE(SUM(ps.turnovers), 0),
+        COALESCE(SUM(ps.fouls), 0),
+        COALESCE(SUM(ps.field_goals_made), 0), COALESCE(SUM(ps.field_goals_attempted), 0),
+        COALESCE(SUM(ps.three_pointers_made), 0), COALESCE(SUM(ps.three_pointers_attempted), 0),
+        COALESCE(SUM(ps.free_throws_made), 0), COALESCE(SUM(ps.free_throws_attempted), 0),
+        COALESCE(SUM(ps.minutes_played), 0)
+    FROM player_stats ps
+    JOIN games g ON ps.game_id = g.id
+    GROUP BY ps.player_id, g.season;
+    
+    INSERT INTO team_season_totals (
+        team, season, stat_lines,
+        points, assists, rebounds, steals, blocks, turnovers, fouls,
+        field_goals_made, field_goals_attempted, three_pointers_made, three_pointers_attempted,
+        free_throws_made, free_throws_attempted, minutes_played
+    )
+    SELECT 
+        p.team, pst.season, SUM(pst.games_played),
+        SUM(pst.points), SUM(pst.assists), SUM(pst.rebounds), SUM(pst.steals), SUM(pst.blocks),
+        SUM(pst.turnovers), SUM(pst.fouls),
+        SUM(pst.field_goals_made), SUM(pst.field_goals_attempted),
+        SUM(pst.three_pointers_made), SUM(pst.three_pointers_attempted),
+        SUM(pst.free_throws_made), SUM(pst.free_throws_attempted), SUM(pst.minutes_played)
+    FROM player_season_totals pst
+    JOIN players p ON pst.player_id = p.id
+    GROUP BY p.team, pst.season;
+$$ LANGUAGE sql;
+
 -- Player Season Averages View
 CREATE OR REPLACE VIEW player_season_averages AS
 SELECT 
@@ -86,56 +193,52 @@ SELECT
     p.name,
     p.team,
     p.position,
-    g.season,
-    COUNT(ps.id) as games_played,
-    ROUND(AVG(ps.points), 1) as avg_points,
-    ROUND(AVG(ps.assists), 1) as avg_assists,
-    ROUND(AVG(ps.rebounds), 1) as avg_rebounds,
-    ROUND(AVG(ps.steals), 1) as avg_steals,
-    ROUND(AVG(ps.blocks), 1) as avg_blocks,
-    ROUND(AVG(ps.minutes_played), 1) as avg_minutes,
+    pst.season,
+    pst.games_played,
+    ROUND(pst.points::NUMERIC / pst.games_played, 1) as avg_points,
+    ROUND(pst.assists::NUMERIC / pst.games_played, 1) as avg_assists,
+    ROUND(pst.rebounds::NUMERIC / pst.games_played, 1) as avg_rebounds,
+    ROUND(pst.steals::NUMERIC / pst.games_played, 1) as avg_steals,
+    ROUND(pst.blocks::NUMERIC / pst.games_played, 1) as avg_blocks,
+    ROUND(pst.minutes_played::NUMERIC / pst.games_played, 1) as avg_minutes,
     ROUND(
         CASE 
-            WHEN SUM(ps.field_goals_attempted) > 0 
-            THEN (SUM(ps.field_goals_made)::FLOAT / SUM(ps.field_goals_attempted)) * 100
+            WHEN pst.field_goals_attempted > 0 
+            THEN (pst.field_goals_made::FLOAT / pst.field_goals_attempted) * 100
             ELSE 0 
-        END, 1
+        END::NUMERIC, 1
     ) as field_goal_pct,
     ROUND(
         CASE 
-            WHEN SUM(ps.three_pointers_attempted) > 0 
-            THEN (SUM(ps.three_pointers_made)::FLOAT / SUM(ps.three_pointers_attempted)) * 100
+            WHEN pst.three_pointers_attempted > 0 
+            THEN (pst.three_pointers_made::FLOAT / pst.three_pointers_attempted) * 100
             ELSE 0 
-        END, 1
+        END::NUMERIC, 1
     ) as three_point_pct
-FROM players p
-JOIN player_stats ps ON p.id = ps.player_id
-JOIN games g ON ps.game_id = g.id
-GROUP BY p.id, p.name, p.team, p.position, g.season;
+FROM player_season_totals pst
+JOIN players p ON p.id = pst.player_id;
 
 -- Team Stats View
 CREATE OR REPLACE VIEW team_stats AS
 SELECT 
-    p.team,
-    g.season,
-    COUNT(DISTINCT p.id) as total_players,
-    COUNT(ps.id) as total_games,
-    ROUND(AVG(ps.points), 1) as avg_points_per_player,
-    ROUND(AVG(ps.assists), 1) as avg_assists_per_player,
-    ROUND(AVG(ps.rebounds), 1) as avg_rebounds_per_player
-FROM players p
-JOIN player_stats ps ON p.id = ps.player_id
-JOIN games g ON ps.game_id = g.id
-GROUP BY p.team, g.season;
+    tst.team,
+    tst.season,
+    (SELECT COUNT(*) FROM player_season_totals pst JOIN players p ON p.id = pst.player_id
+     WHERE p.team = tst.team AND pst.season = tst.season) as total_players,
+    tst.stat_lines as total_games,
+    ROUND(tst.points::NUMERIC / tst.stat_lines, 1) as avg_points_per_player,
+    ROUND(tst.assists::NUMERIC / tst.stat_lines, 1) as avg_assists_per_player,
+    ROUND(tst.rebounds::NUMERIC / tst.stat_lines, 1) as avg_rebounds_per_player
+FROM team_season_totals tst;
 
 -- Get top scorers
 SELECT 
     p.name, 
     p.team,
-    ROUND(AVG(ps.points), 1) as avg_points,
-    COUNT(ps.id) as games_played
+    ROUND(SUM(pst.points)::NUMERIC / SUM(pst.games_played), 1) as avg_points,
+    SUM(pst.games_played) as games_played
 FROM players p
-JOIN player_stats ps ON p.id = ps.player_id
+JOIN player_season_totals pst ON p.id = pst.player_id
 GROUP BY p.id, p.name, p.team
 ORDER BY avg_points DESC
 LIMIT 10;
@@ -91,6 +91,10 @@ def seed_postgresql():
         )
     print(f"Inserted {len(sample_stats)} stat records")
     
+    # Raw inserts bypass the API, which maintains the season totals itself
+    cursor.execute("SELECT refresh_season_totals()")
+    print("Rebuilt season totals")
+    
     conn.commit()
     cursor.close()
     conn.close()
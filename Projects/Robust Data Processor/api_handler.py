@@ -1,77 +1,362 @@
 import json
-import boto3
-import uuid
-from datetime import datetime
+import os
+import time
+
+from aws_clients import get_client, prewarm
+from fair_queue import shard_queue
+from json_codec import dumps, encode_message, loads, parse_log_request
+from payload_store import default_codec, offload_text, payload_key
+from rate_limit import TenantRateLimiter, retry_after_header
+from request_ids import RequestIdGenerator, UtcTimestamps
 
-sqs = boto3.client('sqs')
 QUEUE_URL = 'SQS_QUEUE_URL'
+# Tenants are spread over these queues by hash; each has its own worker event source mapping
+QUEUE_URLS = [url for url in os.environ.get('QUEUE_URLS', '').split(',') if url] or [QUEUE_URL]
+
+# Token-bucket admission per tenant. TENANT_QUOTAS overrides it per tenant, e.g.
+# {"tenant-a": {"rate": 500, "burst": 1000}}. With RATE_LIMIT_TABLE set the buckets
+# are shared by all API containers instead of kept per container.
+RATE_LIMIT_TABLE = os.environ.get('RATE_LIMIT_TABLE', '')
+RATE_LIMITER = TenantRateLimiter(
+    rate=float(os.environ.get('TENANT_RATE_PER_SEC', '100')),
+    burst=float(os.environ.get('TENANT_BURST', '200')),
+    quotas=json.loads(os.environ.get('TENANT_QUOTAS', '{}')),
+    table_name=RATE_LIMIT_TABLE or None
+)
+
+# Claim check: logs larger than this go to S3 compressed and only a reference is queued.
+# Offloading is off when PAYLOAD_BUCKET is unset.
+PAYLOAD_BUCKET = os.environ.get('PAYLOAD_BUCKET', '')
+OFFLOAD_THRESHOLD_BYTES = int(os.environ.get('OFFLOAD_THRESHOLD_BYTES', str(64 * 1024)))
+PAYLOAD_CODEC = os.environ.get('PAYLOAD_CODEC') or default_codec()
+
+# SQS limits: 10 entries per SendMessageBatch, 256 KB per message and per batch
+MAX_BATCH_ENTRIES = 10
+MAX_MESSAGE_BYTES = 256 * 1024
+MAX_SEND_ATTEMPTS = 3
+
+# Cheaper than uuid4() and datetime.utcnow().isoformat() on every request
+new_log_id = RequestIdGenerator()
+utc_now = UtcTimestamps()
+
+# Clients are created on first use; AWS_PREWARM_CLIENTS=sqs builds them during init instead
+prewarm(os.environ.get('AWS_PREWARM_CLIENTS', '').split(','))
+
+def message_body(tenant_id, log_id, text, source):
+    """
+    Serialized queue message; large texts are offloaded and replaced by a reference
+    """
+    # A character is at most 4 UTF-8 bytes, so short texts skip the encode
+    if PAYLOAD_BUCKET and len(text) * 4 > OFFLOAD_THRESHOLD_BYTES and len(text.encode('utf-8')) > OFFLOAD_THRESHOLD_BYTES:
+        payload = offload_text(get_client('s3'), PAYLOAD_BUCKET, payload_key(tenant_id, log_id), text, PAYLOAD_CODEC)
+        return encode_message(tenant_id, log_id, source, utc_now(), payload=payload)
+    return encode_message(tenant_id, log_id, source, utc_now(), text=text)
+
+def message_attributes(tenant_id):
+    return {
+        'tenant_id': {
+            'StringValue': tenant_id,
+            'DataType': 'String'
+        }
+    }
+
+def message_size(body, tenant_id):
+    """
+    Size SQS counts against the 256 KB limit: body plus attribute name, type and value
+    """
+    body_bytes = len(body) if body.isascii() else len(body.encode('utf-8'))
+    return body_bytes + len('tenant_id') + len('String') + len(tenant_id.encode('utf-8'))
+
+def header(headers, name):
+    """
+    Case-insensitive header lookup. API Gateway HTTP APIs already send lower-case
+    names and REST APIs usually keep the client's spelling, so try those first.
+    """
+    value = headers.get(name)
+    if value is None:
+        value = headers.get(name.title())
+    if value is None:
+        for key, key_value in headers.items():
+            if key.lower() == name:
+                return key_value
+    return value
+
+def rate_limited_response(tenant_id, retry_after):
+    return {
+        'statusCode': 429,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Retry-After': retry_after_header(retry_after)
+        },
+        'body': dumps({'error': f"Rate limit exceeded for tenant {tenant_id}"})
+    }
+
+def is_bulk_request(content_type, body):
+    if 'application/x-ndjson' in content_type:
+        return True
+    return 'application/json' in content_type and body.lstrip().startswith('[')
+
+def parse_bulk_logs(content_type, body):
+    """
+    Returns a list of parsed items; lines that are not valid JSON become None
+    """
+    if 'application/x-ndjson' in content_type:
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(loads(line))
+            except json.JSONDecodeError:
+                items.append(None)
+        return items
+    
+    items = loads(body)
+    if not isinstance(items, list):
+        raise ValueError('Expected a JSON array of logs')
+    return items
+
+def validate_logs(items, default_tenant_id):
+    """
+    Splits items into (index, tenant_id, log_id, message body) entries ready to send,
+    rejections, and logs that were rate limited. Each tenant's logs are admitted in
+    order for as long as it has tokens. Also returns the longest Retry-After among
+    rate-limited tenants.
+    """
+    checked = []
+    rejected = []
+    
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            rejected.append({'index': index, 'error': 'Invalid JSON object'})
+            continue
+        
+        tenant_id = item.get('tenant_id') or default_tenant_id or ''
+        log_id = item.get('log_id') or ''
+        text = item.get('text') or ''
+        if not (isinstance(tenant_id, str) and isinstance(log_id, str) and isinstance(text, str)):
+            rejected.append({'index': index, 'error': 'tenant_id, log_id and text must be strings'})
+            continue
+        if not tenant_id or not text:
+            rejected.append({'index': index, 'error': 'Missing tenant_id or text'})
+            continue
+        checked.append((index, tenant_id, log_id, text))
+    
+    counts = {}
+    for _, tenant_id, _, _ in checked:
+        counts[tenant_id] = counts.get(tenant_id, 0) + 1
+    
+    retry_after = 0.0
+    admitted = {}
+    for tenant_id, count in counts.items():
+        admitted[tenant_id], wait = RATE_LIMITER.admit_up_to(tenant_id, count)
+        retry_after = max(retry_after, wait)
+    
+    valid = []
+    limited = []
+    for index, tenant_id, log_id, text in checked:
+        if not admitted[tenant_id]:
+            limited.append({'index': index, 'error': f"Rate limit exceeded for tenant {tenant_id}"})
+            continue
+        admitted[tenant_id] -= 1
+        
+        log_id = log_id or new_log_id()
+        body = message_body(tenant_id, log_id, text, 'bulk_upload')
+        
+        if message_size(body, tenant_id) > MAX_MESSAGE_BYTES:
+            rejected.append({'index': index, 'log_id': log_id, 'error': 'Log exceeds 256 KB message limit and PAYLOAD_BUCKET is not set'})
+            continue
+        
+        valid.append((index, tenant_id, log_id, body))
+    
+    return valid, rejected, limited, retry_after
+
+def group_batches(entries):
+    """
+    Groups entries into SendMessageBatch calls of at most 10 entries and 256 KB
+    """
+    batch = []
+    batch_bytes = 0
+    
+    for entry in entries:
+        index, tenant_id, log_id, message_body = entry
+        size = message_size(message_body, tenant_id)
+        if batch and (len(batch) == MAX_BATCH_ENTRIES or batch_bytes + size > MAX_MESSAGE_BYTES):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(entry)
+        batch_bytes += size
+    
+    if batch:
+        yield batch
+
+def send_batch(batch, queue_url=QUEUE_URL):
+    """
+    Sends one batch, retrying entries that failed on the SQS side with backoff.
+    Returns the entries that could not be sent, with their error.
+    """
+    pending = {str(index): (index, tenant_id, log_id, message_body)
+               for index, tenant_id, log_id, message_body in batch}
+    failed = []
+    
+    for attempt in range(MAX_SEND_ATTEMPTS):
+        try:
+            response = get_client('sqs').send_message_batch(
+                QueueUrl=queue_url,
+                Entries=[
+                    {
+                        'Id': entry_id,
+                        'MessageBody': message_body,
+                        'MessageAttributes': message_attributes(tenant_id)
+                    }
+                    for entry_id, (_, tenant_id, _, message_body) in pending.items()
+                ]
+            )
+        except Exception as e:
+            # boto has already retried the call; other batches may have been queued,
+            # so report this one's entries instead of failing the whole request
+            print(f"Error sending batch to {queue_url}: {str(e)}")
+            for index, _, log_id, _ in pending.values():
+                failed.append({'index': index, 'log_id': log_id, 'error': 'Send failed'})
+            return failed
+
+        retry = {}
+        for failure in response.get('Failed', []):
+            entry = pending[failure['Id']]
+            error = failure.get('Message', failure.get('Code', 'Send failed'))
+            if failure.get('SenderFault'):
+                # Our request was bad; sending it again will not help
+                failed.append({'index': entry[0], 'log_id': entry[2], 'error': error})
+            else:
+                retry[failure['Id']] = entry
+        
+        if not retry:
+            return failed
+        
+        pending = retry
+        if attempt < MAX_SEND_ATTEMPTS - 1:
+            time.sleep(0.1 * (2 ** attempt))
+    
+    for index, _, log_id, _ in pending.values():
+        failed.append({'index': index, 'log_id': log_id, 'error': 'Send failed after retries'})
+    return failed
+
+# Bulk response message per status; the lists in the body say what happened to each log
+BULK_MESSAGES = {
+    202: 'Accepted for processing',
+    400: 'No valid logs to process',
+    429: 'Rate limit exceeded; resend the failed logs after Retry-After',
+    500: 'No logs could be queued'
+}
+
+def handle_bulk(default_tenant_id, body, content_type):
+    try:
+        items = parse_bulk_logs(content_type, body)
+    except (json.JSONDecodeError, ValueError):
+        return {
+            'statusCode': 400,
+            'body': dumps({'error': 'Invalid bulk payload'})
+        }
+    if not items:
+        return {
+            'statusCode': 400,
+            'body': dumps({'error': 'No logs in bulk payload'})
+        }
+    
+    valid, rejected, limited, retry_after = validate_logs(items, default_tenant_id)
+    
+    by_queue = {}
+    for entry in valid:
+        by_queue.setdefault(shard_queue(entry[1], QUEUE_URLS), []).append(entry)
+    
+    send_failed = []
+    for queue_url, entries in by_queue.items():
+        for batch in group_batches(entries):
+            send_failed.extend(send_batch(batch, queue_url))
+    
+    failed_indexes = {f['index'] for f in send_failed}
+    accepted = [log_id for index, _, log_id, _ in valid if index not in failed_indexes]
+    failed = sorted(limited + send_failed, key=lambda f: f['index'])
+    
+    response_headers = {'Content-Type': 'application/json'}
+    if not accepted:
+        status_code = 500 if send_failed else 429 if limited else 400
+    else:
+        status_code = 202
+    if limited:
+        # Rate-limited logs are listed in failed; tell the client when to resend them
+        response_headers['Retry-After'] = retry_after_header(retry_after)
+    
+    return {
+        'statusCode': status_code,
+        'headers': response_headers,
+        'body': dumps({
+            'message': BULK_MESSAGES[status_code],
+            'accepted': len(accepted),
+            'log_ids': accepted,
+            'rejected': rejected,
+            'failed': failed
+        })
+    }
 
 def lambda_handler(event, context):
     try:
-        headers = event.get('headers', {})
+        headers = event.get('headers') or {}
         body = event.get('body', '')
         
-        headers = {k.lower(): v for k, v in headers.items()}
-        content_type = headers.get('content-type', '')
+        content_type = header(headers, 'content-type') or ''
+        
+        if is_bulk_request(content_type, body):
+            # Scenario 3: NDJSON or JSON array of logs
+            return handle_bulk(header(headers, 'x-tenant-id'), body, content_type)
         
         if 'application/json' in content_type:
             # Scenario 1: JSON payload
             try:
-                payload = json.loads(body)
-                tenant_id = payload.get('tenant_id')
-                log_id = payload.get('log_id', str(uuid.uuid4()))
-                text = payload.get('text', '')
-                source = 'json_upload'
-                
-                if not tenant_id or not text:
-                    return {
-                        'statusCode': 400,
-                        'body': json.dumps({'error': 'Missing tenant_id or text'})
-                    }
-                    
-            except json.JSONDecodeError:
+                tenant_id, log_id, text = parse_log_request(body)
+            except ValueError:
                 return {
                     'statusCode': 400,
-                    'body': json.dumps({'error': 'Invalid JSON payload'})
+                    'body': dumps({'error': 'Invalid JSON payload'})
                 }
+            
+            if not tenant_id or not text:
+                return {
+                    'statusCode': 400,
+                    'body': dumps({'error': 'Missing tenant_id or text'})
+                }
+            log_id = log_id or new_log_id()
+            source = 'json_upload'
                 
         elif 'text/plain' in content_type:
             # Scenario 2: Raw text payload
-            tenant_id = headers.get('x-tenant-id')
+            tenant_id = header(headers, 'x-tenant-id')
             
             if not tenant_id:
                 return {
                     'statusCode': 400,
-                    'body': json.dumps({'error': 'Missing X-Tenant-ID header'})
+                    'body': dumps({'error': 'Missing X-Tenant-ID header'})
                 }
             
-            log_id = str(uuid.uuid4())
+            log_id = new_log_id()
             text = body
             source = 'text_upload'
             
         else:
             return {
                 'statusCode': 400,
-                'body': json.dumps({'error': 'Unsupported content type'})
+                'body': dumps({'error': 'Unsupported content type'})
             }
         
-        message = {
-            'tenant_id': tenant_id,
-            'log_id': log_id,
-            'text': text,
-            'source': source,
-            'ingested_at': datetime.utcnow().isoformat()
-        }
+        retry_after = RATE_LIMITER.admit(tenant_id)
+        if retry_after:
+            return rate_limited_response(tenant_id, retry_after)
         
-        sqs.send_message(
-            QueueUrl=QUEUE_URL,
-            MessageBody=json.dumps(message),
-            MessageAttributes={
-                'tenant_id': {
-                    'StringValue': tenant_id,
-                    'DataType': 'String'
-                }
-            }
+        get_client('sqs').send_message(
+            QueueUrl=shard_queue(tenant_id, QUEUE_URLS),
+            MessageBody=message_body(tenant_id, log_id, text, source),
+            MessageAttributes=message_attributes(tenant_id)
         )
         
         return {
@@ -79,7 +364,7 @@ def lambda_handler(event, context):
             'headers': {
                 'Content-Type': 'application/json'
             },
-            'body': json.dumps({
+            'body': dumps({
                 'message': 'Accepted for processing',
                 'log_id': log_id,
                 'tenant_id': tenant_id
@@ -90,5 +375,5 @@ def lambda_handler(event, context):
         print(f"Error: {str(e)}")
         return {
             'statusCode': 500,
-            'body': json.dumps({'error': 'Internal server error'})
-        }
\ No newline at end of file
+            'body': dumps({'error': 'Internal server error'})
+        }
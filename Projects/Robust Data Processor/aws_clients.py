@@ -0,0 +1,61 @@
+"""
+Shared, lazily created AWS clients for the handlers.
+
+boto3 is only imported, and a client only built, the first time a handler
+needs it, so code paths that never touch S3 or the rate-limit table do not
+pay for them during a cold start. All clients share one botocore Config with
+TCP keep-alive and a connection pool sized for the worker's threads.
+
+Local runs and tests register stand-ins instead:
+
+    import aws_clients
+    from local_aws import LocalDynamoDB
+    aws_clients.set_client('dynamodb', LocalDynamoDB())
+"""
+import os
+import threading
+
+# Should cover WORKER_IO_THREADS; botocore's default of 10 makes extra threads wait for a connection
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '32'))
+
+_clients = {}
+_lock = threading.Lock()
+
+def client_config():
+    from botocore.config import Config
+    return Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        connect_timeout=2,
+        read_timeout=10,
+        retries={'mode': 'standard', 'max_attempts': 3}
+    )
+
+def _create(service_name):
+    import boto3
+    if service_name == 'dynamodb':
+        # The resource's client takes plain Python values instead of {'S': ...} descriptors
+        return boto3.resource('dynamodb', config=client_config()).meta.client
+    return boto3.client(service_name, config=client_config())
+
+def get_client(service_name):
+    client = _clients.get(service_name)
+    if client is None:
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                client = _clients[service_name] = _create(service_name)
+    return client
+
+def set_client(service_name, client):
+    with _lock:
+        _clients[service_name] = client
+
+def prewarm(service_names):
+    """
+    Builds clients during the init phase instead, e.g. for provisioned
+    concurrency where init runs before any request arrives
+    """
+    for service_name in service_names:
+        if service_name:
+            get_client(service_name)
@@ -0,0 +1,303 @@
+"""
+Local benchmarks for the Robust Data Processor.
+
+    python benchmark.py pipeline --records 2000 --size 2000
+    python benchmark.py redaction --megabytes 8
+    python benchmark.py coldstart --runs 10
+    python benchmark.py api --requests 20000
+    python benchmark.py streaming --megabytes 300
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+WORDS = ['user', 'login', 'request', 'timeout', 'payment', 'session', 'cache', 'retry',
+         'ERROR', 'WARN', 'INFO', 'DEBUG', 'connected', 'failed', 'order', 'queue']
+
+def synthetic_text(size, rng):
+    """
+    Log-like text of about `size` characters with phone numbers sprinkled in
+    """
+    parts = []
+    length = 0
+    while length < size:
+        roll = rng.random()
+        if roll < 0.05:
+            part = f"{rng.randint(200, 999)}-{rng.randint(1000, 9999)}"
+        elif roll < 0.08:
+            part = '\n'
+        elif roll < 0.1:
+            part = ''.join(rng.choices(string.ascii_letters + string.digits, k=12))
+        else:
+            part = rng.choice(WORDS)
+        parts.append(part)
+        length += len(part) + 1
+    return ' '.join(parts)[:size]
+
+def synthetic_message(size, rng, tenant_id=None):
+    return {
+        'tenant_id': tenant_id or f"tenant-{rng.randint(1, 20)}",
+        'log_id': str(uuid.uuid4()),
+        'text': synthetic_text(size, rng),
+        'source': 'json_upload',
+        'ingested_at': datetime.utcnow().isoformat()
+    }
+
+def synthetic_sqs_records(count, size, rng):
+    return [
+        {'messageId': str(uuid.uuid4()), 'body': json.dumps(synthetic_message(size, rng))}
+        for _ in range(count)
+    ]
+
+def bench_pipeline(args):
+    import worker_handler
+    
+    rng = random.Random(args.seed)
+    messages = [synthetic_message(args.size, rng) for _ in range(args.records)]
+    
+    start = time.perf_counter()
+    for message in messages:
+        worker_handler.process_message(message)
+    elapsed = time.perf_counter() - start
+    
+    megabytes = args.records * args.size / 1e6
+    print(f"{args.records} records of {args.size} chars in {elapsed:.2f}s: "
+          f"{args.records / elapsed:.0f} records/s, {megabytes / elapsed:.1f} MB/s")
+
+def bench_redaction(args):
+    import re
+    from redaction import PII_PATTERNS, RedactionEngine
+    
+    rng = random.Random(args.seed)
+    text = synthetic_text(int(args.megabytes * 1e6), rng)
+    engine = RedactionEngine()
+    
+    def separate_passes(text):
+        # One uncompiled re.sub per pattern, like the original redact_phone_numbers
+        for pattern, _, _ in PII_PATTERNS.values():
+            text = re.sub(pattern, '[REDACTED]', text)
+        return text
+    
+    runs = [
+        ('re.sub per pattern', separate_passes),
+        ('combined, single pass', lambda t: engine.redact(t)[0]),
+        ('combined, 1 MB chunks', lambda t: engine.redact_large(t)[0])
+    ]
+    
+    print(f"Redacting {len(text) / 1e6:.1f} MB with {len(PII_PATTERNS)} patterns")
+    for label, redact in runs:
+        start = time.perf_counter()
+        redact(text)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<24} {elapsed:>7.2f}s {len(text) / 1e6 / elapsed:>7.1f} MB/s")
+    
+    _, counts = engine.redact(text)
+    print(f"Matches: {counts}")
+
+# Runs in a fresh interpreter so every measurement is a cold start
+COLDSTART_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+handler = __import__(sys.argv[1])
+imported = time.perf_counter()
+
+import aws_clients
+try:
+    # Real clients are built (no requests are sent), then swapped for stand-ins
+    for service_name in sys.argv[2].split(','):
+        aws_clients.get_client(service_name)
+    clients_ms = (time.perf_counter() - imported) * 1000
+except ImportError:
+    clients_ms = None
+
+import benchmark, local_aws, random
+class LocalSQS:
+    def send_message(self, **kwargs):
+        return {}
+aws_clients.set_client('sqs', LocalSQS())
+aws_clients.set_client('dynamodb', local_aws.LocalDynamoDB())
+
+if sys.argv[1] == 'api_handler':
+    event = {'headers': {'Content-Type': 'application/json'},
+             'body': json.dumps({'tenant_id': 'tenant-1', 'text': benchmark.synthetic_text(2000, random.Random(0))})}
+else:
+    event = {'Records': benchmark.synthetic_sqs_records(10, 2000, random.Random(0))}
+
+timings = []
+for _ in range(2):
+    invoke_start = time.perf_counter()
+    handler.lambda_handler(event, None)
+    timings.append((time.perf_counter() - invoke_start) * 1000)
+    if sys.argv[1] == 'worker_handler':
+        handler.PROCESSED_KEYS.keys.clear()
+        aws_clients.set_client('dynamodb', local_aws.LocalDynamoDB())
+
+print(json.dumps({'import_ms': (imported - start) * 1000, 'clients_ms': clients_ms,
+                  'first_ms': timings[0], 'warm_ms': timings[1]}), file=sys.stderr)
+"""
+
+HANDLER_SERVICES = {
+    'api_handler': 'sqs',
+    'worker_handler': 'dynamodb'
+}
+
+def bench_coldstart(args):
+    here = os.path.dirname(os.path.abspath(__file__))
+    # Clients need a region and credentials to be built, but nothing is sent
+    env = dict(os.environ, AWS_DEFAULT_REGION=os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'),
+               AWS_ACCESS_KEY_ID='bench', AWS_SECRET_ACCESS_KEY='bench')
+    
+    print(f"Median of {args.runs} fresh interpreters, milliseconds")
+    print(f"{'handler':<16} {'import':>8} {'clients':>8} {'1st call':>9} {'warm call':>10} {'cold total':>11}")
+    for handler, services in HANDLER_SERVICES.items():
+        results = []
+        for _ in range(args.runs):
+            run = subprocess.run([sys.executable, '-c', COLDSTART_CHILD, handler, services],
+                                 cwd=here, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            if run.returncode != 0:
+                raise SystemExit(run.stderr)
+            results.append(json.loads(run.stderr.strip().splitlines()[-1]))
+        
+        def median(name):
+            values = [r[name] for r in results if r[name] is not None]
+            return statistics.median(values) if values else None
+        
+        clients_ms = median('clients_ms')
+        total = median('import_ms') + (clients_ms or 0) + median('first_ms')
+        clients = f"{clients_ms:>8.1f}" if clients_ms is not None else f"{'n/a':>8}"
+        print(f"{handler:<16} {median('import_ms'):>8.1f} {clients} {median('first_ms'):>9.1f} "
+              f"{median('warm_ms'):>10.1f} {total:>11.1f}")
+    
+    if clients_ms is None:
+        print("boto3 is not installed; client creation was not measured")
+
+def bench_api(args):
+    import aws_clients
+    import api_handler
+    from rate_limit import TenantRateLimiter
+    
+    class NullSQS:
+        def send_message(self, **kwargs):
+            return {}
+    
+    aws_clients.set_client('sqs', NullSQS())
+    # Measure parsing and message building, not admission
+    api_handler.RATE_LIMITER = TenantRateLimiter(rate=0, burst=0)
+    
+    rng = random.Random(args.seed)
+    texts = [synthetic_text(args.size, rng) for _ in range(100)]
+    kinds = {
+        'json': lambda i: {
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'tenant_id': f"tenant-{i % 20}", 'text': texts[i % 100]})
+        },
+        'text/plain': lambda i: {
+            'headers': {'Content-Type': 'text/plain', 'X-Tenant-ID': f"tenant-{i % 20}"},
+            'body': texts[i % 100]
+        }
+    }
+    
+    print(f"{args.requests} requests of {args.size} chars per kind")
+    for kind, make_event in kinds.items():
+        events = [make_event(i) for i in range(args.requests)]
+        start = time.process_time()
+        for event in events:
+            api_handler.lambda_handler(event, None)
+        elapsed = time.process_time() - start
+        print(f"{kind:<12} {elapsed / args.requests * 1e6:>8.1f} us CPU per request")
+
+# Processes one offloaded log in a fresh interpreter, so peak RSS belongs to that run only
+STREAMING_CHILD = """
+import json, resource, sys, time
+import aws_clients, worker_handler
+from local_aws import LocalS3
+
+root, mode = sys.argv[1], sys.argv[2]
+message = json.loads(sys.argv[3])
+aws_clients.set_client('s3', LocalS3(root))
+worker_handler.STREAM_MIN_BYTES = 0 if mode == 'stream' else float('inf')
+
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+item = worker_handler.process_message(message)
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({'seconds': elapsed, 'baseline_kb': baseline, 'peak_kb': peak,
+                  'char_count': item['char_count']}), file=sys.stderr)
+"""
+
+def bench_streaming(args):
+    from local_aws import LocalS3
+    from payload_store import default_codec, offload_chunks
+    
+    rng = random.Random(args.seed)
+    # Cycling a few generated blocks keeps setup time down for multi-hundred-MB logs
+    blocks = [synthetic_text(1000000, rng) + '\n' for _ in range(8)]
+    total_chunks = int(args.megabytes)
+    
+    with tempfile.TemporaryDirectory() as root:
+        print(f"Writing a {total_chunks} MB log to a local object store...")
+        ref = offload_chunks(LocalS3(root), 'bench', 'payloads/bench/large/original',
+                             (blocks[i % len(blocks)] for i in range(total_chunks)), default_codec())
+        message = {'tenant_id': 'bench', 'log_id': 'large', 'source': 'benchmark',
+                   'ingested_at': datetime.utcnow().isoformat(), 'payload': ref}
+        print(f"{ref['size'] / 1e6:.0f} MB, {ref['stored_size'] / 1e6:.1f} MB stored ({ref['codec']})\n")
+        print(f"{'mode':<8} {'seconds':>8} {'MB/s':>7} {'peak RSS MB':>12} {'growth MB':>10}")
+        
+        here = os.path.dirname(os.path.abspath(__file__))
+        for mode in ('stream', 'whole'):
+            if mode == 'whole' and args.megabytes > args.whole_max_megabytes:
+                print(f"{mode:<8} skipped above --whole-max-megabytes {args.whole_max_megabytes:.0f}")
+                continue
+            run = subprocess.run([sys.executable, '-c', STREAMING_CHILD, root, mode, json.dumps(message)],
+                                 cwd=here, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            if run.returncode != 0:
+                print(f"{mode:<8} failed: {run.stderr.strip().splitlines()[-1]}")
+                continue
+            result = json.loads(run.stderr.strip().splitlines()[-1])
+            print(f"{mode:<8} {result['seconds']:>8.1f} {ref['size'] / 1e6 / result['seconds']:>7.1f} "
+                  f"{result['peak_kb'] / 1024:>12.0f} {(result['peak_kb'] - result['baseline_kb']) / 1024:>10.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Robust Data Processor benchmarks')
+    parser.add_argument('--seed', type=int, default=0)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    pipeline_parser = subparsers.add_parser('pipeline', help='Worker processing stages on synthetic records')
+    pipeline_parser.add_argument('--records', type=int, default=2000)
+    pipeline_parser.add_argument('--size', type=int, default=2000, help='Characters per record')
+    pipeline_parser.set_defaults(func=bench_pipeline)
+    
+    redaction_parser = subparsers.add_parser('redaction', help='PII redaction throughput on one large log')
+    redaction_parser.add_argument('--megabytes', type=float, default=8)
+    redaction_parser.set_defaults(func=bench_redaction)
+    
+    coldstart_parser = subparsers.add_parser('coldstart', help='Handler import and first-invocation time')
+    coldstart_parser.add_argument('--runs', type=int, default=10)
+    coldstart_parser.set_defaults(func=bench_coldstart)
+    
+    api_parser = subparsers.add_parser('api', help='api_handler CPU time per request')
+    api_parser.add_argument('--requests', type=int, default=20000)
+    api_parser.add_argument('--size', type=int, default=2000, help='Characters per log')
+    api_parser.set_defaults(func=bench_api)
+    
+    streaming_parser = subparsers.add_parser('streaming', help='Worker memory on one very large offloaded log')
+    streaming_parser.add_argument('--megabytes', type=float, default=300)
+    streaming_parser.add_argument('--whole-max-megabytes', type=float, default=1000,
+                                  help='Skip the whole-text run above this size')
+    streaming_parser.set_defaults(func=bench_streaming)
+    
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
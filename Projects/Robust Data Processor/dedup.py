@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+
+# BatchGetItem takes at most 100 keys per request
+GET_BATCH_SIZE = 100
+MAX_GET_ATTEMPTS = 3
+
+class ProcessedKeyCache:
+    """
+    Thread-safe LRU set of recently stored (tenant_id, log_id) keys. It lives
+    for as long as the Lambda container stays warm, so redeliveries that land
+    on the same container are skipped without touching DynamoDB.
+    """
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.keys = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            if key in self.keys:
+                self.keys.move_to_end(key)
+                return True
+            return False
+
+    def add_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.keys[key] = True
+                self.keys.move_to_end(key)
+            while len(self.keys) > self.capacity:
+                self.keys.popitem(last=False)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.keys)
+
+def find_stored_keys(client, table_name, keys, key_names=('tenant_id', 'log_id')):
+    """
+    Returns the subset of `keys` that already exist in the table, fetching only
+    the key attributes with BatchGetItem
+    """
+    stored = set()
+    keys = list(keys)
+    projection = ', '.join(f"#k{i}" for i in range(len(key_names)))
+    names = {f"#k{i}": name for i, name in enumerate(key_names)}
+
+    for start in range(0, len(keys), GET_BATCH_SIZE):
+        request = {
+            table_name: {
+                'Keys': [dict(zip(key_names, key)) for key in keys[start:start + GET_BATCH_SIZE]],
+                'ProjectionExpression': projection,
+                'ExpressionAttributeNames': names
+            }
+        }
+        for attempt in range(MAX_GET_ATTEMPTS):
+            response = client.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(table_name, []):
+                stored.add(tuple(item[name] for name in key_names))
+
+            request = response.get('UnprocessedKeys') or {}
+            if not request:
+                break
+            time.sleep(0.05 * (2 ** attempt))
+
+    return stored
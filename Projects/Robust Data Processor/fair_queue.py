@@ -0,0 +1,11 @@
+import zlib
+
+def shard_queue(tenant_id, queue_urls):
+    """
+    Picks a tenant's queue by a stable hash, so a noisy tenant only delays the
+    tenants that share its shard. Each shard queue gets its own event source
+    mapping, so shards are drained side by side.
+    """
+    if len(queue_urls) == 1:
+        return queue_urls[0]
+    return queue_urls[zlib.crc32(tenant_id.encode('utf-8')) % len(queue_urls)]
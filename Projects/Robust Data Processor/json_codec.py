@@ -0,0 +1,83 @@
+"""
+JSON encoding and decoding for the handlers' hot paths.
+
+Uses orjson when it is installed and the stdlib json module otherwise, and
+msgspec, when installed, to decode single-log requests straight into a
+validated struct. Every backend raises ValueError on bad input.
+"""
+import json
+from json.encoder import encode_basestring_ascii
+from typing import Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if orjson is not None:
+    loads = orjson.loads
+
+    def dumps(obj):
+        return orjson.dumps(obj).decode('utf-8')
+
+    def quote(value):
+        return orjson.dumps(value).decode('utf-8')
+else:
+    loads = json.loads
+    dumps = json.dumps
+    # What json.dumps does for a str, without going through JSONEncoder
+    quote = encode_basestring_ascii
+
+if msgspec is not None:
+    class LogRequest(msgspec.Struct):
+        tenant_id: Optional[str] = None
+        text: Optional[str] = None
+        log_id: Optional[str] = None
+
+    _log_request_decoder = msgspec.json.Decoder(LogRequest)
+
+def parse_log_request(body):
+    """
+    Returns (tenant_id, log_id, text) from a single-log JSON body; missing
+    fields come back empty. Raises ValueError for invalid JSON, a body that is
+    not an object, or fields that are not strings.
+    """
+    if msgspec is not None:
+        try:
+            request = _log_request_decoder.decode(body)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from None
+        return request.tenant_id or '', request.log_id or '', request.text or ''
+
+    payload = loads(body)
+    if not isinstance(payload, dict):
+        raise ValueError('Expected a JSON object')
+    tenant_id = payload.get('tenant_id') or ''
+    log_id = payload.get('log_id') or ''
+    text = payload.get('text') or ''
+    if not (isinstance(tenant_id, str) and isinstance(log_id, str) and isinstance(text, str)):
+        raise ValueError('tenant_id, log_id and text must be strings')
+    return tenant_id, log_id, text
+
+def encode_message(tenant_id, log_id, source, ingested_at, text=None, payload=None):
+    """
+    Serializes a queue message directly, without building a dict first.
+    `source` and `ingested_at` are ours and need no escaping; exactly one of
+    text and payload (an offload reference) is set.
+    """
+    if payload is not None:
+        content = '"payload":' + dumps(payload)
+    else:
+        content = '"text":' + quote(text)
+    return ''.join((
+        '{"tenant_id":', quote(tenant_id),
+        ',"log_id":', quote(log_id),
+        ',"source":"', source,
+        '","ingested_at":"', ingested_at,
+        '",', content, '}'
+    ))
@@ -0,0 +1,339 @@
+"""
+Local stand-ins for the AWS calls the handlers make, for local runs and tests.
+
+    import aws_clients
+    from local_aws import LocalDynamoDB, LocalS3, LocalSQS
+    aws_clients.set_client('dynamodb', LocalDynamoDB(unprocessed_rate=0.2))
+    aws_clients.set_client('s3', LocalS3('/tmp/payloads'))
+    aws_clients.set_client('sqs', LocalSQS(visibility_timeout=5))
+"""
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, defaultdict
+
+class ConditionalCheckFailed(Exception):
+    # Shaped like botocore's ClientError so callers can check the error code
+    response = {'Error': {'Code': 'ConditionalCheckFailedException'}}
+
+class ValidationFailed(Exception):
+    response = {'Error': {'Code': 'ValidationException'}}
+
+# DynamoDB rejects items larger than this (names and values together)
+MAX_ITEM_BYTES = 400 * 1024
+
+def item_size(value):
+    """
+    Rough DynamoDB size of a value: UTF-8 strings and binary by length,
+    numbers at their maximum, maps and lists as the sum of their parts
+    """
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(item_size(name) + item_size(v) for name, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(item_size(v) for v in value)
+    return 21
+
+def check_item_size(item):
+    if item_size(item) > MAX_ITEM_BYTES:
+        raise ValidationFailed('Item size has exceeded the maximum allowed size')
+
+CONDITION_TERM = re.compile(r'attribute_not_exists\((\w+)\)|(\w+) = (:\w+)')
+
+def condition_holds(expression, item, values):
+    """
+    Evaluates the subset of condition expressions the handlers use:
+    `attribute_not_exists(name)` and `name = :value` terms joined by OR
+    """
+    for term in expression.split(' OR '):
+        match = CONDITION_TERM.fullmatch(term.strip())
+        if match is None:
+            raise ValueError(f"Unsupported condition: {term}")
+        if match.group(1):
+            if item is None or match.group(1) not in item:
+                return True
+        elif item is not None and item.get(match.group(2)) == values[match.group(3)]:
+            return True
+    return False
+
+class LocalDynamoDB:
+    """
+    Mimics the DynamoDB client (resource-style Python values, no type
+    descriptors). `unprocessed_rate` makes that fraction of batch writes come
+    back as UnprocessedItems, like throttling does; `fail_keys` makes writes
+    of those (tenant_id, log_id) keys always come back unprocessed. Items
+    over 400 KB raise ValidationException, failing their whole batch.
+    """
+
+    def __init__(self, key_names=('tenant_id', 'log_id'), unprocessed_rate=0.0, fail_keys=(), seed=0):
+        self.key_names = key_names
+        self.unprocessed_rate = unprocessed_rate
+        self.fail_keys = set(fail_keys)
+        self.tables = defaultdict(dict)
+        # (table name, key) -> time.time() of the last write, for end-to-end latency
+        self.written_at = {}
+        self.calls = Counter()
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def key(self, item):
+        return tuple(item[name] for name in self.key_names)
+
+    def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeValues=None, **kwargs):
+        with self.lock:
+            self.calls['put_item'] += 1
+            check_item_size(Item)
+            table = self.tables[TableName]
+            key = self.key(Item)
+            if ConditionExpression and not condition_holds(ConditionExpression, table.get(key), ExpressionAttributeValues or {}):
+                raise ConditionalCheckFailed('The conditional request failed')
+            table[key] = dict(Item)
+            self.written_at[(TableName, key)] = time.time()
+        return {}
+
+    def get_item(self, TableName, Key, **kwargs):
+        with self.lock:
+            self.calls['get_item'] += 1
+            item = self.tables[TableName].get(self.key(Key))
+        return {'Item': dict(item)} if item is not None else {}
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        responses = {}
+        with self.lock:
+            self.calls['batch_get_item'] += 1
+            for table_name, request in RequestItems.items():
+                if len(request['Keys']) > 100:
+                    raise ValueError('Too many items requested for the BatchGetItem call')
+                found = [self.tables[table_name].get(self.key(key)) for key in request['Keys']]
+                responses[table_name] = [dict(item) for item in found if item is not None]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        unprocessed = {}
+        with self.lock:
+            self.calls['batch_write_item'] += 1
+            total = sum(len(requests) for requests in RequestItems.values())
+            if total > 25:
+                raise ValueError('Too many items requested for the BatchWriteItem call')
+
+            for table_name, requests in RequestItems.items():
+                keys = [self.key(r['PutRequest']['Item']) for r in requests]
+                if len(set(keys)) != len(keys):
+                    raise ValueError('Provided list of item keys contains duplicates')
+                # One oversized item fails the whole request, as in DynamoDB
+                for request in requests:
+                    check_item_size(request['PutRequest']['Item'])
+
+                for request, key in zip(requests, keys):
+                    if key in self.fail_keys or self.rng.random() < self.unprocessed_rate:
+                        unprocessed.setdefault(table_name, []).append(request)
+                    else:
+                        self.tables[table_name][key] = dict(request['PutRequest']['Item'])
+                        self.written_at[(table_name, key)] = time.time()
+
+        return {'UnprocessedItems': unprocessed}
+
+    def items(self, table_name):
+        with self.lock:
+            return list(self.tables[table_name].values())
+
+class LocalS3:
+    """
+    Mimics the S3 client calls used for offloaded payloads, keeping objects
+    as files under `root` (one directory per bucket)
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def path(self, bucket, key):
+        path = os.path.normpath(os.path.join(self.root, bucket, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Invalid key: {key}")
+        return path
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        with self.lock:
+            self.calls['put_object'] += 1
+        path = self.path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp{threading.get_ident()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(Body if isinstance(Body, bytes) else Body.read())
+        os.replace(tmp_path, path)
+        return {}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        with self.lock:
+            self.calls['get_object'] += 1
+        path = self.path(Bucket, Key)
+        if not os.path.exists(path):
+            raise KeyError(f"NoSuchKey: {Key}")
+        # Like StreamingBody: read(n) and close()
+        return {'Body': open(path, 'rb'), 'ContentLength': os.path.getsize(path)}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        with self.lock:
+            self.calls['create_multipart_upload'] += 1
+        upload_id = str(uuid.uuid4())
+        os.makedirs(os.path.join(self.root, '.uploads', upload_id))
+        return {'Bucket': Bucket, 'Key': Key, 'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        with self.lock:
+            self.calls['upload_part'] += 1
+        # Parts go to disk so they do not count against the caller's memory
+        with open(os.path.join(self.root, '.uploads', UploadId, str(PartNumber)), 'wb') as f:
+            f.write(Body)
+        return {'ETag': f'"{UploadId}-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        with self.lock:
+            self.calls['complete_multipart_upload'] += 1
+        parts = MultipartUpload['Parts']
+        upload_dir = os.path.join(self.root, '.uploads', UploadId)
+        paths = [os.path.join(upload_dir, str(part['PartNumber'])) for part in parts]
+        if any(os.path.getsize(p) < 5 * 1024 * 1024 for p in paths[:-1]):
+            raise ValueError('EntityTooSmall: parts except the last must be at least 5 MiB')
+
+        path = self.path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as out:
+            for part_path in paths:
+                with open(part_path, 'rb') as f:
+                    while True:
+                        data = f.read(1024 * 1024)
+                        if not data:
+                            break
+                        out.write(data)
+        self.abort_multipart_upload(Bucket, Key, UploadId)
+        return {'Bucket': Bucket, 'Key': Key}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        upload_dir = os.path.join(self.root, '.uploads', UploadId)
+        for name in os.listdir(upload_dir):
+            os.remove(os.path.join(upload_dir, name))
+        os.rmdir(upload_dir)
+        return {}
+
+    def object_size(self, bucket, key):
+        return os.path.getsize(self.path(bucket, key))
+
+class LocalSQS:
+    """
+    Mimics a standard SQS queue for each QueueUrl: received messages stay
+    invisible for the visibility timeout and come back unless deleted, and
+    after `max_receive_count` receives they move to the queue's dead-letter
+    list. `send_fail_rate` makes that fraction of batch entries fail the way
+    throttling does (SenderFault false).
+    """
+
+    def __init__(self, visibility_timeout=30, max_receive_count=5, send_fail_rate=0.0, seed=0):
+        self.visibility_timeout = visibility_timeout
+        self.max_receive_count = max_receive_count
+        self.send_fail_rate = send_fail_rate
+        self.queues = defaultdict(OrderedDict)
+        self.dead_letters = defaultdict(list)
+        self.calls = Counter()
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def _enqueue(self, queue_url, body, attributes):
+        message_id = str(uuid.uuid4())
+        self.queues[queue_url][message_id] = {
+            'MessageId': message_id,
+            'Body': body,
+            'MessageAttributes': attributes or {},
+            'sent_at': time.time(),
+            'visible_at': 0.0,
+            'receive_count': 0,
+            'receipt_handle': None
+        }
+        return message_id
+
+    def send_message(self, QueueUrl, MessageBody, MessageAttributes=None, **kwargs):
+        if len(MessageBody.encode('utf-8')) > 256 * 1024:
+            raise ValueError('Message must be shorter than 262144 bytes')
+        with self.lock:
+            self.calls['send_message'] += 1
+            return {'MessageId': self._enqueue(QueueUrl, MessageBody, MessageAttributes)}
+
+    def send_message_batch(self, QueueUrl, Entries, **kwargs):
+        if len(Entries) > 10:
+            raise ValueError('Too many entries in the SendMessageBatch call')
+        if sum(len(e['MessageBody'].encode('utf-8')) for e in Entries) > 256 * 1024:
+            raise ValueError('Batch requests cannot be longer than 262144 bytes')
+
+        successful = []
+        failed = []
+        with self.lock:
+            self.calls['send_message_batch'] += 1
+            for entry in Entries:
+                if self.rng.random() < self.send_fail_rate:
+                    failed.append({'Id': entry['Id'], 'SenderFault': False,
+                                   'Code': 'ServiceUnavailable', 'Message': 'Simulated failure'})
+                    continue
+                message_id = self._enqueue(QueueUrl, entry['MessageBody'], entry.get('MessageAttributes'))
+                successful.append({'Id': entry['Id'], 'MessageId': message_id})
+        return {'Successful': successful, 'Failed': failed}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, VisibilityTimeout=None, **kwargs):
+        timeout = self.visibility_timeout if VisibilityTimeout is None else VisibilityTimeout
+        now = time.time()
+        messages = []
+        with self.lock:
+            self.calls['receive_message'] += 1
+            queue = self.queues[QueueUrl]
+            for message_id, message in list(queue.items()):
+                if len(messages) == MaxNumberOfMessages:
+                    break
+                if message['visible_at'] > now:
+                    continue
+                if self.max_receive_count and message['receive_count'] >= self.max_receive_count:
+                    del queue[message_id]
+                    self.dead_letters[QueueUrl].append(message)
+                    continue
+
+                message['receive_count'] += 1
+                message['visible_at'] = now + timeout
+                message['receipt_handle'] = f"{message_id}:{message['receive_count']}"
+                messages.append({
+                    'MessageId': message_id,
+                    'ReceiptHandle': message['receipt_handle'],
+                    'Body': message['Body'],
+                    'Attributes': {
+                        'ApproximateReceiveCount': str(message['receive_count']),
+                        'SentTimestamp': str(int(message['sent_at'] * 1000))
+                    },
+                    'MessageAttributes': message['MessageAttributes']
+                })
+        return {'Messages': messages} if messages else {}
+
+    def delete_message(self, QueueUrl, ReceiptHandle, **kwargs):
+        with self.lock:
+            self.calls['delete_message'] += 1
+            message_id = ReceiptHandle.split(':', 1)[0]
+            message = self.queues[QueueUrl].get(message_id)
+            # Like SQS, only the latest receipt handle deletes the message
+            if message is not None and message['receipt_handle'] == ReceiptHandle:
+                del self.queues[QueueUrl][message_id]
+        return {}
+
+    def stats(self, queue_url):
+        """
+        (visible, in flight, age in seconds of the oldest message) for one queue
+        """
+        now = time.time()
+        with self.lock:
+            messages = list(self.queues[queue_url].values())
+        visible = sum(1 for m in messages if m['visible_at'] <= now)
+        oldest = min((m['sent_at'] for m in messages), default=now)
+        return visible, len(messages) - visible, now - oldest
@@ -0,0 +1,306 @@
+"""
+Runs api_handler -> SQS -> worker_handler end to end in one process, with the
+stand-ins from local_aws, and drives it with a load generator.
+
+    python local_harness.py --rate 200 --duration 20 --tenants 50
+    python local_harness.py --rate 500 --pollers 8 --shards 4 --unprocessed-rate 0.1
+
+Requests are sent open loop at --rate, mixing single JSON logs, raw text and
+NDJSON bulk uploads from tenants of skewed sizes. Pollers act like the SQS
+event source mapping: they receive batches, invoke the worker and delete
+everything except the records it reports in batchItemFailures, which come
+back after the visibility timeout.
+
+The report covers ingest throughput, queue lag (time from send to first
+receive, and queue depth) and end-to-end latency from the API call until the
+item is written.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import statistics
+import threading
+import time
+import uuid
+
+WORKER_TABLE = 'ProcessedLogs'
+
+def percentiles(values, points=(50, 95, 99)):
+    if not values:
+        return {p: 0.0 for p in points}
+    if len(values) == 1:
+        return {p: values[0] for p in points}
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return {p: cuts[p - 1] for p in points}
+
+class Poller(threading.Thread):
+    """
+    One concurrent worker invocation slot, draining the shard queues round-robin
+    """
+
+    def __init__(self, sqs, queue_urls, worker, batch_size, stop, metrics):
+        super().__init__(daemon=True)
+        self.sqs = sqs
+        self.queue_urls = queue_urls
+        self.worker = worker
+        self.batch_size = batch_size
+        self.stop = stop
+        self.metrics = metrics
+
+    def run(self):
+        turn = 0
+        while not self.stop.is_set():
+            queue_url = self.queue_urls[turn % len(self.queue_urls)]
+            turn += 1
+            messages = self.sqs.receive_message(QueueUrl=queue_url,
+                                                MaxNumberOfMessages=self.batch_size).get('Messages', [])
+            if not messages:
+                if turn % len(self.queue_urls) == 0:
+                    time.sleep(0.01)
+                continue
+
+            now = time.time()
+            records = []
+            for message in messages:
+                if message['Attributes']['ApproximateReceiveCount'] == '1':
+                    self.metrics.record('queue_wait', now - int(message['Attributes']['SentTimestamp']) / 1000)
+                else:
+                    self.metrics.count('redeliveries')
+                records.append({
+                    'messageId': message['MessageId'],
+                    'receiptHandle': message['ReceiptHandle'],
+                    'body': message['Body'],
+                    'attributes': message['Attributes'],
+                    'messageAttributes': message['MessageAttributes']
+                })
+
+            start = time.perf_counter()
+            try:
+                response = self.worker.lambda_handler({'Records': records}, None)
+                failed = {f['itemIdentifier'] for f in response.get('batchItemFailures', [])}
+            except Exception as e:
+                # A raised error fails the whole batch, as with Lambda
+                print(f"Worker invocation failed: {str(e)}")
+                failed = {record['messageId'] for record in records}
+            self.metrics.record('invocation', time.perf_counter() - start)
+            self.metrics.count('invocations')
+
+            for record in records:
+                if record['messageId'] in failed:
+                    self.metrics.count('record_failures')
+                else:
+                    self.sqs.delete_message(QueueUrl=queue_url, ReceiptHandle=record['receiptHandle'])
+
+class Metrics:
+    def __init__(self):
+        self.samples = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, value):
+        with self.lock:
+            self.samples.setdefault(name, []).append(value)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+class LoadGenerator:
+    """
+    Builds API Gateway events: single JSON logs, text/plain logs and NDJSON
+    bulk uploads, from tenants whose share of traffic follows a Zipf-like skew
+    """
+
+    def __init__(self, tenants, size, text_fraction, bulk_fraction, bulk_size, skew, rng):
+        from benchmark import synthetic_text
+        self.synthetic_text = synthetic_text
+        self.tenant_ids = [f"tenant-{i + 1}" for i in range(tenants)]
+        self.weights = [1 / (i + 1) ** skew for i in range(tenants)]
+        self.size = size
+        self.text_fraction = text_fraction
+        self.bulk_fraction = bulk_fraction
+        self.bulk_size = bulk_size
+        self.rng = rng
+
+    def text(self):
+        # Sizes vary around --size, with the occasional log ten times larger
+        size = int(self.rng.expovariate(1 / self.size)) + 1
+        if self.rng.random() < 0.01:
+            size *= 10
+        return self.synthetic_text(size, self.rng)
+
+    def next_event(self):
+        """
+        Returns (event, tenant_id, log_ids); log_ids is None when the API assigns them
+        """
+        tenant_id = self.rng.choices(self.tenant_ids, self.weights)[0]
+        roll = self.rng.random()
+
+        if roll < self.bulk_fraction:
+            logs = [{'tenant_id': tenant_id, 'log_id': str(uuid.uuid4()), 'text': self.text()}
+                    for _ in range(self.bulk_size)]
+            event = {'headers': {'Content-Type': 'application/x-ndjson'},
+                     'body': '\n'.join(json.dumps(log) for log in logs)}
+            return event, tenant_id, [log['log_id'] for log in logs]
+
+        if roll < self.bulk_fraction + self.text_fraction:
+            event = {'headers': {'Content-Type': 'text/plain', 'X-Tenant-ID': tenant_id},
+                     'body': self.text()}
+            return event, tenant_id, None
+
+        log_id = str(uuid.uuid4())
+        event = {'headers': {'Content-Type': 'application/json'},
+                 'body': json.dumps({'tenant_id': tenant_id, 'log_id': log_id, 'text': self.text()})}
+        return event, tenant_id, [log_id]
+
+def run_load(api, generator, rate, duration, metrics, submitted):
+    """
+    Sends requests open loop: a slow API call delays the next send, but the
+    schedule is not reset, so the offered rate holds
+    """
+    interval = 1 / rate
+    start = time.perf_counter()
+    next_send = start
+    while next_send - start < duration:
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        next_send += interval
+
+        event, tenant_id, log_ids = generator.next_event()
+        sent_at = time.time()
+        call_start = time.perf_counter()
+        response = api.lambda_handler(event, None)
+        metrics.record('api', time.perf_counter() - call_start)
+        metrics.count(f"status_{response['statusCode']}")
+
+        if response['statusCode'] != 202:
+            continue
+        body = json.loads(response['body'])
+        if log_ids is None:
+            log_ids = [body['log_id']]
+        elif 'log_ids' in body:
+            log_ids = body['log_ids']
+        for log_id in log_ids:
+            submitted[(tenant_id, log_id)] = sent_at
+        metrics.count('accepted_logs', len(log_ids))
+
+    return time.perf_counter() - start
+
+def sample_queues(sqs, queue_urls, stop, metrics):
+    while not stop.wait(0.25):
+        visible = in_flight = 0
+        oldest = 0.0
+        for queue_url in queue_urls:
+            v, f, age = sqs.stats(queue_url)
+            visible += v
+            in_flight += f
+            oldest = max(oldest, age)
+        metrics.record('depth', visible + in_flight)
+        metrics.record('oldest_age', oldest)
+
+def queues_empty(sqs, queue_urls):
+    return all(sum(sqs.stats(queue_url)[:2]) == 0 for queue_url in queue_urls)
+
+def report(metrics, sqs, db, queue_urls, submitted, elapsed, drained_after):
+    counters = metrics.counters
+    accepted = counters.get('accepted_logs', 0)
+    statuses = ', '.join(f"{name[7:]}: {count}" for name, count in sorted(counters.items())
+                         if name.startswith('status_'))
+
+    latencies = []
+    for key, sent_at in submitted.items():
+        written_at = db.written_at.get((WORKER_TABLE, key))
+        if written_at is not None:
+            latencies.append(written_at - sent_at)
+    dead = sum(len(sqs.dead_letters[queue_url]) for queue_url in queue_urls)
+
+    def line(label, values, scale=1000, unit='ms'):
+        p = percentiles(values)
+        print(f"  {label:<22} p50 {p[50] * scale:8.1f}{unit}  p95 {p[95] * scale:8.1f}{unit}  "
+              f"p99 {p[99] * scale:8.1f}{unit}  max {max(values, default=0) * scale:8.1f}{unit}")
+
+    print(f"\nIngest: {accepted} logs accepted in {elapsed:.1f}s ({accepted / elapsed:.0f} logs/s); "
+          f"responses {statuses}")
+    print(f"Processed: {len(latencies)} of {accepted} logs stored, {dead} dead-lettered, "
+          f"drained {drained_after:.1f}s after load stopped")
+    print(f"Worker: {counters.get('invocations', 0)} invocations, "
+          f"{counters.get('record_failures', 0)} record failures, {counters.get('redeliveries', 0)} redeliveries")
+    print(f"Queue: max depth {max(metrics.samples.get('depth', [0])):.0f}, "
+          f"oldest message up to {max(metrics.samples.get('oldest_age', [0])):.2f}s")
+    line('API call', metrics.samples.get('api', []))
+    line('queue wait', metrics.samples.get('queue_wait', []))
+    line('worker invocation', metrics.samples.get('invocation', []))
+    line('end to end', latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description='Local end-to-end run of the ingestion pipeline')
+    parser.add_argument('--rate', type=float, default=200, help='API requests per second')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of load')
+    parser.add_argument('--tenants', type=int, default=50)
+    parser.add_argument('--skew', type=float, default=1.0, help='Zipf exponent of tenant traffic; 0 is uniform')
+    parser.add_argument('--size', type=int, default=2000, help='Mean characters per log')
+    parser.add_argument('--text-fraction', type=float, default=0.3, help='Share of text/plain requests')
+    parser.add_argument('--bulk-fraction', type=float, default=0.1, help='Share of NDJSON bulk requests')
+    parser.add_argument('--bulk-size', type=int, default=20, help='Logs per bulk request')
+    parser.add_argument('--pollers', type=int, default=4, help='Concurrent worker invocations')
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--shards', type=int, default=1, help='Number of tenant shard queues')
+    parser.add_argument('--visibility-timeout', type=float, default=5)
+    parser.add_argument('--max-receive-count', type=int, default=5)
+    parser.add_argument('--unprocessed-rate', type=float, default=0.0,
+                        help='Share of DynamoDB batch writes returned unprocessed')
+    parser.add_argument('--send-fail-rate', type=float, default=0.0, help='Share of SQS batch entries that fail')
+    parser.add_argument('--drain-timeout', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help="Show the handlers' own log lines")
+    args = parser.parse_args()
+
+    # The handlers read their configuration at import
+    os.environ['QUEUE_URLS'] = ','.join(f"local-queue-{i}" for i in range(args.shards))
+    import aws_clients
+    import api_handler
+    import worker_handler
+    from local_aws import LocalDynamoDB, LocalSQS
+
+    sqs = LocalSQS(args.visibility_timeout, args.max_receive_count, args.send_fail_rate, args.seed)
+    db = LocalDynamoDB(unprocessed_rate=args.unprocessed_rate, seed=args.seed)
+    aws_clients.set_client('sqs', sqs)
+    aws_clients.set_client('dynamodb', db)
+    queue_urls = api_handler.QUEUE_URLS
+
+    metrics = Metrics()
+    submitted = {}
+    stop_pollers = threading.Event()
+    stop_sampler = threading.Event()
+    pollers = [Poller(sqs, queue_urls, worker_handler, args.batch_size, stop_pollers, metrics)
+               for _ in range(args.pollers)]
+    sampler = threading.Thread(target=sample_queues, args=(sqs, queue_urls, stop_sampler, metrics), daemon=True)
+    for thread in pollers + [sampler]:
+        thread.start()
+
+    generator = LoadGenerator(args.tenants, args.size, args.text_fraction, args.bulk_fraction,
+                              args.bulk_size, args.skew, random.Random(args.seed))
+    print(f"Sending {args.rate:.0f} requests/s for {args.duration:.0f}s from {args.tenants} tenants "
+          f"to {len(queue_urls)} queue(s), {args.pollers} pollers")
+    with open(os.devnull, 'w') as devnull, contextlib.ExitStack() as stack:
+        if not args.verbose:
+            # The handlers print a line per log; at load rates that costs more than the work
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+        elapsed = run_load(api_handler, generator, args.rate, args.duration, metrics, submitted)
+
+        load_stopped = time.perf_counter()
+        while not queues_empty(sqs, queue_urls) and time.perf_counter() - load_stopped < args.drain_timeout:
+            time.sleep(0.05)
+        drained_after = time.perf_counter() - load_stopped
+        stop_pollers.set()
+        stop_sampler.set()
+        for thread in pollers + [sampler]:
+            thread.join()
+
+    report(metrics, sqs, db, queue_urls, submitted, elapsed, drained_after)
+
+if __name__ == '__main__':
+    main()
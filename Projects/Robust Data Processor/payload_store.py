@@ -0,0 +1,160 @@
+import codecs
+import gzip
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # gzip is always available
+    zstandard = None
+
+# Texts smaller than this are stored as plain strings; compressing them saves little
+COMPRESS_MIN_BYTES = 1024
+READ_CHUNK_BYTES = 1024 * 1024
+# S3 multipart parts must be at least 5 MiB, except the last
+PART_BYTES = 8 * 1024 * 1024
+PAYLOAD_PREFIX = 'payloads'
+
+def default_codec():
+    return 'zstd' if zstandard is not None else 'gzip'
+
+def compress(data, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if codec == 'gzip':
+        return gzip.compress(data, compresslevel=6)
+    raise ValueError(f"Unknown codec: {codec}")
+
+def decompress(data, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    if codec == 'gzip':
+        return gzip.decompress(data)
+    raise ValueError(f"Unknown codec: {codec}")
+
+def compressor(codec):
+    """
+    Incremental compressor with compress(data) and flush(); its output
+    concatenated is the same format compress() produces
+    """
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    if codec == 'gzip':
+        # wbits 16 + 15 writes a gzip header and trailer around the deflate stream
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    raise ValueError(f"Unknown codec: {codec}")
+
+def open_decompressed(stream, codec):
+    """
+    Wraps a readable binary stream (e.g. an S3 StreamingBody) so reads return
+    decompressed bytes
+    """
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().stream_reader(stream)
+    if codec == 'gzip':
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    raise ValueError(f"Unknown codec: {codec}")
+
+def payload_key(tenant_id, log_id, part='original'):
+    # Tenant first, so a tenant's payloads can be listed, expired or deleted together
+    return f"{PAYLOAD_PREFIX}/{tenant_id}/{log_id}/{part}"
+
+def offload_text(s3, bucket, key, text, codec):
+    """
+    Compresses text into the object store and returns the reference that
+    travels in its place
+    """
+    data = text.encode('utf-8')
+    body = compress(data, codec)
+    s3.put_object(Bucket=bucket, Key=key, Body=body, ContentEncoding=codec,
+                  ContentType='text/plain; charset=utf-8')
+    return {
+        'bucket': bucket,
+        'key': key,
+        'codec': codec,
+        'size': len(data),
+        'stored_size': len(body)
+    }
+
+def offload_chunks(s3, bucket, key, chunks, codec, part_bytes=PART_BYTES):
+    """
+    Streams text chunks into the object store as a compressed multipart
+    upload, holding at most about one part in memory. Returns the same
+    reference as offload_text().
+    """
+    upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key, ContentEncoding=codec,
+                                           ContentType='text/plain; charset=utf-8')['UploadId']
+    parts = []
+    size = stored_size = 0
+    buffer = bytearray()
+    
+    def upload(data):
+        response = s3.upload_part(Bucket=bucket, Key=key, UploadId=upload_id,
+                                  PartNumber=len(parts) + 1, Body=data)
+        parts.append({'PartNumber': len(parts) + 1, 'ETag': response['ETag']})
+    
+    try:
+        stream = compressor(codec)
+        for chunk in chunks:
+            data = chunk.encode('utf-8')
+            size += len(data)
+            buffer += stream.compress(data)
+            if len(buffer) >= part_bytes:
+                upload(bytes(buffer))
+                stored_size += len(buffer)
+                buffer.clear()
+        buffer += stream.flush()
+        upload(bytes(buffer))
+        stored_size += len(buffer)
+        s3.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                     MultipartUpload={'Parts': parts})
+    except Exception:
+        # Otherwise the uploaded parts are kept (and billed) until a lifecycle rule removes them
+        s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+    
+    return {
+        'bucket': bucket,
+        'key': key,
+        'codec': codec,
+        'size': size,
+        'stored_size': stored_size
+    }
+
+def iter_offloaded_text(s3, ref, chunk_bytes=READ_CHUNK_BYTES):
+    """
+    Streams an offloaded payload back as text chunks without holding the
+    compressed object in memory
+    """
+    body = s3.get_object(Bucket=ref['bucket'], Key=ref['key'])['Body']
+    reader = open_decompressed(body, ref['codec'])
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        while True:
+            data = reader.read(chunk_bytes)
+            if not data:
+                break
+            text = decoder.decode(data)
+            if text:
+                yield text
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+    finally:
+        reader.close()
+        body.close()
+
+def pack_text(text, codec, min_bytes=COMPRESS_MIN_BYTES):
+    """
+    Returns (value, codec) for storing text in an item: the string itself
+    when it is small, otherwise compressed bytes and the codec used
+    """
+    data = text.encode('utf-8')
+    if len(data) < min_bytes:
+        return text, None
+    return compress(data, codec), codec
+
+def unpack_text(value, codec):
+    if codec is None:
+        return value
+    # boto3 returns Binary attributes wrapped; .value is the raw bytes
+    return decompress(getattr(value, 'value', value), codec).decode('utf-8')
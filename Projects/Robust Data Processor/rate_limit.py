@@ -0,0 +1,158 @@
+import math
+import threading
+import time
+from decimal import Decimal
+
+from aws_clients import get_client
+
+# Optimistic-concurrency retries when several API containers update one tenant's bucket
+MAX_SHARED_ATTEMPTS = 3
+
+def split_cost(tokens, cost, rate, burst, partial):
+    """
+    (tokens to take, seconds until the rest are available) for a bucket
+    holding `tokens`. The rest waits for at most a full bucket's worth.
+    """
+    if tokens >= cost:
+        return cost, 0.0
+    taken = int(tokens) if partial else 0
+    return taken, (min(cost - taken, burst) - (tokens - taken)) / rate
+
+class TokenBucket:
+    """
+    Classic token bucket: holds at most `burst` tokens and refills at `rate`
+    tokens per second
+    """
+
+    def __init__(self, rate, burst, now=None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic() if now is None else now
+        self.lock = threading.Lock()
+
+    def take(self, cost=1, now=None):
+        """
+        Takes `cost` tokens if available. Returns 0 when admitted, otherwise
+        the seconds until enough tokens will have refilled.
+        """
+        return self.take_up_to(cost, now, partial=False)[1]
+
+    def take_up_to(self, cost, now=None, partial=True):
+        """
+        Takes as many whole tokens as are available, up to `cost` (all or
+        nothing unless `partial`). Returns (tokens taken, seconds until the
+        rest could be taken).
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            taken, wait = split_cost(self.tokens, cost, self.rate, self.burst, partial)
+            self.tokens -= taken
+            return taken, wait
+
+class TenantRateLimiter:
+    """
+    Per-tenant token-bucket admission. `quotas` overrides the default
+    {'rate': per second, 'burst': tokens} for individual tenants; a rate of 0
+    means unlimited, and a burst below 1 is raised to 1.
+
+    Buckets live in this container unless `table_name` is given, in which case
+    they are kept in that DynamoDB table (partition key tenant_id) so every API
+    container draws from the same bucket.
+    """
+
+    def __init__(self, rate, burst, quotas=None, table_name=None):
+        self.rate = rate
+        self.burst = burst
+        self.quotas = quotas or {}
+        self.table_name = table_name
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def quota(self, tenant_id):
+        quota = self.quotas.get(tenant_id, {})
+        # A bucket must hold at least one request's token, or that request could never be admitted
+        burst = max(float(quota.get('burst', self.burst)), 1.0)
+        return float(quota.get('rate', self.rate)), burst
+
+    def admit(self, tenant_id, cost=1):
+        """
+        Returns 0 if the request is admitted, otherwise the seconds the tenant
+        should wait before retrying (math.inf if `cost` can never fit)
+        """
+        rate, burst = self.quota(tenant_id)
+        if rate <= 0:
+            return 0.0
+        if cost > burst:
+            return math.inf
+        return self._take(tenant_id, cost, rate, burst, partial=False)[1]
+
+    def admit_up_to(self, tenant_id, count):
+        """
+        Admits as many of `count` requests as the tenant has tokens for, e.g.
+        the logs of a bulk upload. Returns (number admitted, seconds before
+        the rest should be retried).
+        """
+        rate, burst = self.quota(tenant_id)
+        if rate <= 0:
+            return count, 0.0
+        return self._take(tenant_id, count, rate, burst, partial=True)
+
+    def _take(self, tenant_id, cost, rate, burst, partial):
+        if self.table_name:
+            try:
+                return self._take_shared(tenant_id, cost, rate, burst, partial)
+            except Exception as e:
+                # Rate limiting must not take ingestion down; fall back to this container's bucket
+                print(f"Shared rate limit check failed for tenant {tenant_id}: {str(e)}")
+
+        with self.lock:
+            bucket = self.buckets.get(tenant_id)
+            if bucket is None:
+                bucket = self.buckets[tenant_id] = TokenBucket(rate, burst)
+        return bucket.take_up_to(cost, partial=partial)
+
+    def _take_shared(self, tenant_id, cost, rate, burst, partial):
+        client = get_client('dynamodb')
+        for _ in range(MAX_SHARED_ATTEMPTS):
+            now = time.time()
+            response = client.get_item(TableName=self.table_name, Key={'tenant_id': tenant_id},
+                                       ConsistentRead=True)
+            item = response.get('Item')
+            if item is None:
+                tokens = burst
+            else:
+                elapsed = max(now - float(item['updated_at']), 0.0)
+                tokens = min(burst, float(item['tokens']) + elapsed * rate)
+
+            taken, wait = split_cost(tokens, cost, rate, burst, partial)
+            if not taken:
+                return 0, wait
+
+            new_item = {
+                'tenant_id': tenant_id,
+                'tokens': Decimal(str(round(tokens - taken, 6))),
+                'updated_at': Decimal(str(round(now, 6)))
+            }
+            if item is None:
+                condition = {'ConditionExpression': 'attribute_not_exists(tenant_id)'}
+            else:
+                condition = {
+                    'ConditionExpression': 'updated_at = :prev',
+                    'ExpressionAttributeValues': {':prev': item['updated_at']}
+                }
+            try:
+                client.put_item(TableName=self.table_name, Item=new_item, **condition)
+                return taken, wait
+            except Exception as e:
+                if getattr(e, 'response', {}).get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                    raise
+                # Another container took tokens first; re-read and try again
+
+        raise RuntimeError('Too much contention on the shared bucket')
+
+def retry_after_header(seconds):
+    # Retry-After takes whole seconds
+    return str(max(1, math.ceil(seconds)))
@@ -0,0 +1,143 @@
+import re
+
+# name: (regex, longest possible match, lookahead guard)
+# Each pattern has a bounded match length so streamed chunks only need a fixed overlap.
+# Consecutive patterns with the same guard share one lookahead, so most positions are
+# rejected after a single character test instead of trying every alternative.
+# Order matters: at a given position the first alternative that matches wins.
+PII_PATTERNS = {
+    'email': (r'(?<![A-Za-z0-9._%+-])[A-Za-z0-9._%+-]{1,64}@[A-Za-z0-9-]{1,63}(?:\.[A-Za-z0-9-]{1,63}){0,4}\.[A-Za-z]{2,24}', 420, None),
+    'ssn': (r'\b\d{3}-\d{2}-\d{4}\b', 11, r'\d'),
+    'credit_card': (r'\b\d(?:[ -]?\d){12,18}\b', 37, r'\d'),
+    'ip': (r'\b(?:(?:25[0-5]|2[0-4]\d|1?\d?\d)\.){3}(?:25[0-5]|2[0-4]\d|1?\d?\d)\b', 15, r'\d'),
+    'phone': (r'\b(?:\d{3}[-.])?\d{3}[-.]?\d{4}\b', 13, r'\d')
+}
+
+def luhn_valid(number):
+    """
+    Luhn checksum over the digits of `number`; real card numbers pass it,
+    while most other long digit runs (timestamps, order and trace ids) do not
+    """
+    total = 0
+    for i, digit in enumerate(reversed([int(c) for c in number if c.isdigit()])):
+        if i % 2:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return total % 10 == 0
+
+# Matches of these patterns are only redacted when the check passes
+PII_VALIDATORS = {
+    'credit_card': luhn_valid
+}
+
+DEFAULT_REPLACEMENT = '[REDACTED]'
+DEFAULT_CHUNK_CHARS = 1024 * 1024
+
+class RedactionEngine:
+    """
+    Redacts several PII patterns in one pass using a single compiled
+    alternation regex, counting matches per pattern
+    """
+
+    def __init__(self, pattern_names=None, replacement=DEFAULT_REPLACEMENT):
+        pattern_names = list(PII_PATTERNS) if pattern_names is None else list(pattern_names)
+        unknown = [name for name in pattern_names if name not in PII_PATTERNS]
+        if unknown:
+            raise ValueError(f"Unknown PII patterns: {', '.join(unknown)}")
+
+        self.pattern_names = pattern_names
+        self.replacement = replacement
+        self.pattern = re.compile(self._combine(pattern_names))
+        # Longest possible match; a streamed chunk keeps this much text back for the next one
+        self.overlap = max(PII_PATTERNS[name][1] for name in pattern_names)
+
+    @staticmethod
+    def _combine(pattern_names):
+        groups = []
+        for name in pattern_names:
+            regex, _, guard = PII_PATTERNS[name]
+            if groups and groups[-1][0] == guard:
+                groups[-1][1].append(f"(?P<{name}>{regex})")
+            else:
+                groups.append((guard, [f"(?P<{name}>{regex})"]))
+
+        parts = []
+        for guard, alternatives in groups:
+            joined = '|'.join(alternatives)
+            parts.append(f"(?={guard})(?:{joined})" if guard else joined)
+        return '|'.join(parts)
+
+    def _replacer(self, counts):
+        replacement = self.replacement
+
+        def replace(match):
+            name = match.lastgroup
+            validator = PII_VALIDATORS.get(name)
+            if validator is not None and not validator(match.group()):
+                return match.group()
+            counts[name] = counts.get(name, 0) + 1
+            return replacement
+
+        return replace
+
+    def redact(self, text):
+        """
+        Returns (redacted text, {pattern name: count})
+        """
+        counts = {}
+        return self.pattern.sub(self._replacer(counts), text), counts
+
+    def redact_chunks(self, chunks, counts):
+        """
+        Redacts an iterable of text chunks, yielding redacted pieces and adding
+        to `counts`. A match is never split across a chunk boundary: the tail
+        of each chunk that could still be part of a match is held back and
+        scanned again together with the next chunk.
+        """
+        replace = self._replacer(counts)
+        overlap = self.overlap
+        buffer = ''
+        start = 0  # buffer[:start] was already emitted and is kept only as \b context
+
+        for chunk in chunks:
+            buffer += chunk
+            limit = len(buffer) - overlap
+            if limit <= start:
+                continue
+
+            out = []
+            pos = start
+            for match in self.pattern.finditer(buffer, start):
+                if match.end() > limit:
+                    # Might still grow, or start earlier, once the next chunk arrives; leave it for then
+                    limit = min(limit, match.start())
+                    break
+                out.append(buffer[pos:match.start()])
+                out.append(replace(match))
+                pos = match.end()
+            out.append(buffer[pos:limit])
+            yield ''.join(out)
+
+            # Keep one emitted character of context so word boundaries still work
+            context = max(limit - 1, 0)
+            buffer = buffer[context:]
+            start = limit - context
+
+        out = []
+        pos = start
+        for match in self.pattern.finditer(buffer, start):
+            out.append(buffer[pos:match.start()])
+            out.append(replace(match))
+            pos = match.end()
+        out.append(buffer[pos:])
+        yield ''.join(out)
+
+    def redact_large(self, text, chunk_chars=DEFAULT_CHUNK_CHARS):
+        """
+        Same result as redact(), scanning a large string in bounded chunks
+        """
+        counts = {}
+        chunks = (text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars))
+        return ''.join(self.redact_chunks(chunks, counts)), counts
@@ -1,66 +1,485 @@
-import json
-import boto3
-import time
+import os
+import random
 import re
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from decimal import Decimal
+
+from aws_clients import get_client, prewarm
+from dedup import ProcessedKeyCache, find_stored_keys
+from json_codec import loads
+from payload_store import default_codec, iter_offloaded_text, offload_chunks, offload_text, pack_text, payload_key
+from redaction import RedactionEngine
 
-dynamodb = boto3.resource('dynamodb')
 TABLE_NAME = 'ProcessedLogs'
-table = dynamodb.Table(TABLE_NAME)
+
+# Clients are created on first use; AWS_PREWARM_CLIENTS=dynamodb builds them during init instead
+prewarm(os.environ.get('AWS_PREWARM_CLIENTS', '').split(','))
+
+# Stored texts are compressed with this codec once they pass payload_store.COMPRESS_MIN_BYTES
+PAYLOAD_CODEC = os.environ.get('PAYLOAD_CODEC') or default_codec()
+PAYLOAD_BUCKET = os.environ.get('PAYLOAD_BUCKET', '')
+# DynamoDB items max out at 400 KB; the stored texts together get this much of it and
+# whatever does not fit goes to PAYLOAD_BUCKET instead
+MAX_INLINE_TEXT_BYTES = int(os.environ.get('MAX_INLINE_TEXT_BYTES', str(300 * 1024)))
+
+# Offloaded logs above this size are processed as a stream of chunks with bounded memory
+STREAM_MIN_BYTES = int(os.environ.get('STREAM_MIN_BYTES', str(8 * 1024 * 1024)))
+STREAM_CHUNK_BYTES = int(os.environ.get('STREAM_CHUNK_BYTES', str(1024 * 1024)))
+
+# Records in a batch are handled concurrently; the pool bounds in-flight DynamoDB calls
+IO_THREADS = int(os.environ.get('WORKER_IO_THREADS', '8'))
+
+# BatchWriteItem takes at most 25 puts; unprocessed items are retried with backoff
+WRITE_BATCH_SIZE = 25
+MAX_WRITE_ATTEMPTS = 5
+# Errors that fail a whole BatchWriteItem call but may pass on a retry. Any other
+# client error (e.g. ValidationException) comes from an item and will fail again.
+RETRYABLE_ERROR_CODES = {
+    'ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded',
+    'InternalServerError', 'ServiceUnavailable'
+}
+
+# Keys stored by this container, checked before any processing so redeliveries are skipped
+PROCESSED_KEYS = ProcessedKeyCache(int(os.environ.get('DEDUP_CACHE_SIZE', '10000')))
+# Also ask DynamoDB which keys already exist (covers redeliveries to other containers)
+DEDUP_CHECK_STORE = os.environ.get('DEDUP_CHECK_STORE', 'true').lower() == 'true'
+
+CONTROL_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+SEVERITY_PATTERN = re.compile(r'\b(FATAL|CRITICAL|ERROR|WARN(?:ING)?|INFO|DEBUG)\b', re.IGNORECASE)
+SEVERITY_RANK = {'FATAL': 5, 'CRITICAL': 5, 'ERROR': 4, 'WARN': 3, 'WARNING': 3, 'INFO': 2, 'DEBUG': 1}
+
+# Compiled once per container; REDACT_PATTERNS picks from phone, email, ssn, credit_card, ip
+REDACTION_ENGINE = RedactionEngine(
+    os.environ['REDACT_PATTERNS'].split(',') if os.environ.get('REDACT_PATTERNS') else None
+)
+PHONE_ENGINE = RedactionEngine(['phone'])
 
 def redact_phone_numbers(text):
     """
     Redact phone numbers from text
     """
-    pattern = r'\b\d{3}[-.]?\d{4}\b'
-    return re.sub(pattern, '[REDACTED]', text)
+    return PHONE_ENGINE.redact(text)[0]
 
-def lambda_handler(event, context):
+# ===== PROCESSING STAGES =====
+# Each stage takes the log being processed ({'text': ..., 'metadata': {...}}) and
+# returns it, updated. Stages run in the order given by PIPELINE_STAGES.
+
+def normalize_text(text):
+    text = unicodedata.normalize('NFC', text)
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return CONTROL_CHARS.sub('', text)
+
+def normalize_stage(log):
     """
-    Worker function that processes messages from SQS
-    Simulates heavy processing with sleep
-    Stores results in DynamoDB with multi-tenant isolation
+    Unicode NFC, Unix line endings and no control characters
+    """
+    log['text'] = normalize_text(log['text'])
+    return log
+
+def redaction_stage(log):
+    """
+    Remove PII from the text in a single pass and record counts per pattern
+    """
+    log['text'], counts = REDACTION_ENGINE.redact_large(log['text'])
+    log['metadata']['redactions'] = counts
+    return log
+
+def enrichment_stage(log):
+    """
+    Attach line/word counts and the highest severity level mentioned
+    """
+    text = log['text']
+    levels = {m.upper() for m in SEVERITY_PATTERN.findall(text)}
+    log['metadata'].update({
+        'line_count': text.count('\n') + 1,
+        'word_count': len(text.split()),
+        'severity': max(levels, key=SEVERITY_RANK.get) if levels else 'NONE'
+    })
+    return log
+
+STAGES = {
+    'normalize': normalize_stage,
+    'redact': redaction_stage,
+    'enrich': enrichment_stage
+}
+
+# ===== STREAMING STAGES =====
+# Same stages for logs too large to hold in memory: each takes an iterator of text
+# chunks and the metadata dict, and yields output chunks. Text that could still
+# change once the next chunk arrives is held back until then.
+
+# Non-ASCII text with no whitespace is held back up to this many characters
+NORMALIZE_MAX_CARRY = 64 * 1024
+
+def normalize_safe_cut(text):
+    """
+    Index before which normalize_text gives the same result whatever follows.
+    Nothing composes with a preceding ASCII or whitespace character, so the
+    cut goes just before the last one, and never between \r and what follows.
+    """
+    cut = None
+    for i in range(len(text) - 1, max(len(text) - 64, 0) - 1, -1):
+        if text[i] < '\x80':
+            cut = i
+            break
+    if cut is None:
+        cut = max((i for i in range(len(text) - 1, -1, -1) if text[i].isspace()), default=0)
+    if cut == 0 and len(text) > NORMALIZE_MAX_CARRY:
+        # Pathological input: fall back to the last character that starts a combining sequence
+        cut = len(text) - 1
+        while cut > 0 and unicodedata.combining(text[cut]):
+            cut -= 1
+    if cut > 0 and text[cut - 1] == '\r':
+        cut -= 1
+    return cut
+
+def normalize_chunks(chunks, metadata):
+    carry = ''
+    for chunk in chunks:
+        text = carry + chunk
+        cut = normalize_safe_cut(text)
+        carry = text[cut:]
+        if cut:
+            yield normalize_text(text[:cut])
+    if carry:
+        yield normalize_text(carry)
+
+def redaction_chunks(chunks, metadata):
+    counts = metadata['redactions'] = {}
+    yield from REDACTION_ENGINE.redact_chunks(chunks, counts)
+
+def enrichment_chunks(chunks, metadata):
+    line_count = 1
+    word_count = 0
+    levels = set()
+    # End of the text seen so far, rescanned with the next chunk; tail[:offset] is only \b context
+    tail = ''
+    offset = 0
+    in_word = False
+    
+    for chunk in chunks:
+        if not chunk:
+            continue
+        line_count += chunk.count('\n')
+        word_count += len(chunk.split())
+        if in_word and not chunk[0].isspace():
+            # The word started in the previous chunk and was already counted
+            word_count -= 1
+        in_word = not chunk[-1].isspace()
+        
+        # A match touching the end of the chunk may continue in the next one ("ERROR" + "S"),
+        # so it is left for the next scan, which starts with the tail of this one
+        scan = tail + chunk
+        levels.update(m.group(1).upper() for m in SEVERITY_PATTERN.finditer(scan, offset) if m.end() < len(scan))
+        if len(scan) > 10:
+            tail, offset = scan[-10:], 1
+        else:
+            tail = scan
+        yield chunk
+    
+    levels.update(m.group(1).upper() for m in SEVERITY_PATTERN.finditer(tail, offset))
+    metadata.update({
+        'line_count': line_count,
+        'word_count': word_count,
+        'severity': max(levels, key=SEVERITY_RANK.get) if levels else 'NONE'
+    })
+
+STREAM_STAGES = {
+    'normalize': normalize_chunks,
+    'redact': redaction_chunks,
+    'enrich': enrichment_chunks
+}
+
+def build_pipeline(stage_names, stages=STAGES):
+    unknown = [name for name in stage_names if name not in stages]
+    if unknown:
+        raise ValueError(f"Unknown processing stages: {', '.join(unknown)}")
+    return [stages[name] for name in stage_names]
+
+PIPELINE_STAGE_NAMES = os.environ.get('PIPELINE_STAGES', 'normalize,redact,enrich').split(',')
+PIPELINE = build_pipeline(PIPELINE_STAGE_NAMES)
+STREAM_PIPELINE = build_pipeline(PIPELINE_STAGE_NAMES, STREAM_STAGES)
+
+def run_pipeline(text, pipeline=None):
+    log = {'text': text, 'metadata': {}}
+    for stage in PIPELINE if pipeline is None else pipeline:
+        log = stage(log)
+    return log
+
+def run_stream_pipeline(chunks, metadata, pipeline=None):
+    for stage in STREAM_PIPELINE if pipeline is None else pipeline:
+        chunks = stage(chunks, metadata)
+    return chunks
+
+def read_text(message):
+    """
+    Returns the log text, streaming it back from S3 when the API offloaded it
+    """
+    if 'payload' in message:
+        return ''.join(iter_offloaded_text(get_client('s3'), message['payload']))
+    return message['text']
+
+def text_attributes(texts, tenant_id, log_id):
+    """
+    Item attributes for the stored texts ({name: text}): a plain string when
+    short, compressed bytes plus `<name>_codec` otherwise. When the texts
+    together would not fit in an item, the largest go to S3 as `<name>_ref`.
+    Without PAYLOAD_BUCKET the original text is left out instead
+    (`original_text_omitted`), and ValueError is raised if the rest still
+    does not fit.
+    """
+    packed = {name: pack_text(text, PAYLOAD_CODEC) for name, text in texts.items()}
+    size = sum(len(value) for value, _ in packed.values())
+    attributes = {}
+    
+    for name in sorted(packed, key=lambda name: len(packed[name][0]), reverse=True):
+        if size <= MAX_INLINE_TEXT_BYTES:
+            break
+        if PAYLOAD_BUCKET:
+            key = payload_key(tenant_id, log_id, name)
+            attributes[f"{name}_ref"] = offload_text(get_client('s3'), PAYLOAD_BUCKET, key, texts[name], PAYLOAD_CODEC)
+        elif name == 'original_text':
+            attributes['original_text_omitted'] = True
+        else:
+            continue
+        size -= len(packed.pop(name)[0])
+    
+    if size > MAX_INLINE_TEXT_BYTES:
+        raise ValueError(f"Stored text needs {size} bytes, more than the {MAX_INLINE_TEXT_BYTES} an item can hold, "
+                         f"and PAYLOAD_BUCKET is not set")
+    
+    for name, (value, codec) in packed.items():
+        attributes[name] = value
+        if codec is not None:
+            attributes[f"{name}_codec"] = codec
+    return attributes
+
+def process_large_message(message):
     """
+    Streams an offloaded log through the pipeline chunk by chunk and uploads
+    the result in parts, so memory stays flat whatever the log size
+    """
+    tenant_id = message['tenant_id']
+    log_id = message['log_id']
+    payload = message['payload']
+    s3 = get_client('s3')
+    char_count = 0
+    metadata = {}
+    
+    def source():
+        nonlocal char_count
+        for chunk in iter_offloaded_text(s3, payload, STREAM_CHUNK_BYTES):
+            char_count += len(chunk)
+            yield chunk
+    
+    start = time.perf_counter()
+    key = payload_key(tenant_id, log_id, 'modified_data')
+    modified_ref = offload_chunks(s3, PAYLOAD_BUCKET or payload['bucket'], key,
+                                  run_stream_pipeline(source(), metadata), PAYLOAD_CODEC)
+    processing_time = time.perf_counter() - start
+    
+    return {
+        'tenant_id': tenant_id,
+        'log_id': log_id,
+        'source': message['source'],
+        'metadata': metadata,
+        'char_count': char_count,
+        'processing_time': Decimal(str(round(processing_time, 6))),
+        'ingested_at': message['ingested_at'],
+        'processed_at': datetime.utcnow().isoformat(),
+        'original_text_ref': payload,
+        'modified_data_ref': modified_ref
+    }
+
+def process_message(message):
+    """
+    CPU-bound part of a record: run the pipeline and build the DynamoDB item
+    """
+    if 'payload' in message and message['payload']['size'] >= STREAM_MIN_BYTES:
+        return process_large_message(message)
+    
+    tenant_id = message['tenant_id']
+    log_id = message['log_id']
+    text = read_text(message)
+    
+    start = time.perf_counter()
+    log = run_pipeline(text)
+    processing_time = time.perf_counter() - start
+    
+    item = {
+        'tenant_id': tenant_id,
+        'log_id': log_id,
+        'source': message['source'],
+        'metadata': log['metadata'],
+        'char_count': len(text),
+        # DynamoDB rejects Python floats
+        'processing_time': Decimal(str(round(processing_time, 6))),
+        'ingested_at': message['ingested_at'],
+        'processed_at': datetime.utcnow().isoformat()
+    }
+    
+    if 'payload' in message:
+        # The original is already in S3; keep the reference instead of a second copy
+        item['original_text_ref'] = message['payload']
+        texts = {'modified_data': log['text']}
+    else:
+        texts = {'original_text': text, 'modified_data': log['text']}
+    item.update(text_attributes(texts, tenant_id, log_id))
+    return item
+
+def item_key(item):
+    return (item['tenant_id'], item['log_id'])
+
+def group_messages(records):
+    """
+    Parses records and groups them by (tenant_id, log_id), so a log delivered
+    twice in one batch is processed once. Returns ({key: (message, messageIds)},
+    messageIds that could not be parsed).
+    """
+    grouped = {}
+    failures = []
+    for record in records:
+        try:
+            message = loads(record['body'])
+            key = item_key(message)
+        except Exception as e:
+            print(f"Error parsing record {record.get('messageId')}: {str(e)}")
+            failures.append(record['messageId'])
+            continue
+        
+        if key in grouped:
+            grouped[key][1].append(record['messageId'])
+        else:
+            grouped[key] = (message, [record['messageId']])
+    return grouped, failures
+
+def drop_already_processed(grouped):
+    """
+    Removes keys that were already stored, first from the warm in-process
+    cache and then with a keys-only BatchGetItem. Returns how many were dropped.
+    """
+    duplicates = [key for key in grouped if key in PROCESSED_KEYS]
+    
+    if DEDUP_CHECK_STORE:
+        unchecked = [key for key in grouped if key not in duplicates]
+        try:
+            stored = find_stored_keys(get_client('dynamodb'), TABLE_NAME, unchecked) if unchecked else set()
+        except Exception as e:
+            # At-least-once delivery still holds; we just may redo some work
+            print(f"Duplicate check failed, processing all records: {str(e)}")
+            stored = set()
+        PROCESSED_KEYS.add_many(stored)
+        duplicates.extend(stored)
     
-    for record in event['Records']:
+    for key in duplicates:
+        print(f"Skipping duplicate log {key[1]} for tenant {key[0]}")
+        del grouped[key]
+    return len(duplicates)
+
+def prepare_entry(entry):
+    """
+    Returns (item, messageIds); item is None if the log could not be processed
+    """
+    message, message_ids = entry
+    try:
+        item = process_message(message)
+        print(f"Processed log {item['log_id']} for tenant {item['tenant_id']}: {item['char_count']} chars in {item['processing_time']}s")
+        return item, message_ids
+    except Exception as e:
+        print(f"Error processing messages {message_ids}: {str(e)}")
+        return None, message_ids
+
+def error_code(e):
+    # botocore's ClientError carries the service's error code; other exceptions have none
+    return getattr(e, 'response', {}).get('Error', {}).get('Code')
+
+def put_each(pending):
+    """
+    Writes {key: (item, messageIds)} one PutItem at a time, after the batch
+    was rejected because of one of its items. Returns the keys that failed.
+    """
+    failed = {}
+    for key, (item, message_ids) in pending.items():
+        try:
+            get_client('dynamodb').put_item(TableName=TABLE_NAME, Item=item)
+        except Exception as e:
+            print(f"Error writing log {key[1]} for tenant {key[0]}: {str(e)}")
+            failed[key] = (item, message_ids)
+    return failed
+
+def write_batch(entries):
+    """
+    Writes one batch of (item, messageIds), retrying unprocessed items with
+    exponential backoff and jitter. If the batch is rejected outright because
+    of an item, the items are written one by one so only the bad ones fail.
+    Returns the messageIds whose items could not be written.
+    """
+    pending = {item_key(item): (item, message_ids) for item, message_ids in entries}
+    all_keys = set(pending)
+    
+    for attempt in range(MAX_WRITE_ATTEMPTS):
+        if attempt:
+            time.sleep(random.uniform(0, 0.05 * (2 ** attempt)))
+        
         try:
-            message = json.loads(record['body'])
-            
-            tenant_id = message['tenant_id']
-            log_id = message['log_id']
-            text = message['text']
-            source = message['source']
-            ingested_at = message['ingested_at']
-            
-            char_count = len(text)
-            sleep_time = char_count * 0.05
-            
-            print(f"Processing log {log_id} for tenant {tenant_id}: {char_count} chars, sleeping {sleep_time}s")
-            time.sleep(sleep_time)
-            
-            modified_data = redact_phone_numbers(text)
-            
-            item = {
-                'tenant_id': tenant_id,
-                'log_id': log_id,
-                'source': source,
-                'original_text': text,
-                'modified_data': modified_data,
-                'char_count': char_count,
-                'processing_time': sleep_time,
-                'ingested_at': ingested_at,
-                'processed_at': datetime.utcnow().isoformat()
-            }
-            
-            table.put_item(Item=item)
-            
-            print(f"Successfully processed and stored log {log_id} for tenant {tenant_id}")
-            
+            response = get_client('dynamodb').batch_write_item(RequestItems={
+                TABLE_NAME: [{'PutRequest': {'Item': item}} for item, _ in pending.values()]
+            })
         except Exception as e:
-            print(f"Error processing record: {str(e)}")
-            raise e
+            code = error_code(e)
+            if code is not None and code not in RETRYABLE_ERROR_CODES:
+                print(f"Batch write rejected ({code}), writing {len(pending)} items one by one: {str(e)}")
+                pending = put_each(pending)
+                break
+            # Throttling or a transient service error fails the whole request
+            print(f"Batch write attempt {attempt + 1} failed: {str(e)}")
+            continue
+        
+        unprocessed = response.get('UnprocessedItems', {}).get(TABLE_NAME, [])
+        pending = {item_key(r['PutRequest']['Item']): pending[item_key(r['PutRequest']['Item'])] for r in unprocessed}
+        if not pending:
+            break
+    
+    PROCESSED_KEYS.add_many(all_keys - set(pending))
+    if not pending:
+        return []
+    
+    print(f"Giving up on {len(pending)} items")
+    return [message_id for _, message_ids in pending.values() for message_id in message_ids]
+
+def lambda_handler(event, context):
+    """
+    Worker function that processes messages from SQS
+    Skips logs that were already stored, before doing any work on them
+    Runs each log through the processing pipeline, records concurrently
+    Stores results in DynamoDB with multi-tenant isolation, 25 items per write
+
+    Returns a partial batch response: only records listed in batchItemFailures
+    are retried by SQS (the event source mapping needs ReportBatchItemFailures)
+    """
+    
+    records = event['Records']
+    grouped, failures = group_messages(records)
+    skipped = drop_already_processed(grouped)
+    entries = list(grouped.values())
+    
+    with ThreadPoolExecutor(max_workers=min(IO_THREADS, max(len(entries), 1))) as pool:
+        prepared = []
+        for item, message_ids in pool.map(prepare_entry, entries):
+            if item is None:
+                failures.extend(message_ids)
+            else:
+                prepared.append((item, message_ids))
+        
+        batches = [prepared[i:i + WRITE_BATCH_SIZE] for i in range(0, len(prepared), WRITE_BATCH_SIZE)]
+        for failed in pool.map(write_batch, batches):
+            failures.extend(failed)
+    
+    print(f"Stored {len(prepared)} logs, skipped {skipped} duplicates, {len(failures)} of {len(records)} records failed")
     
     return {
-        'statusCode': 200,
-        'body': json.dumps('Processing complete')
-    }
\ No newline at end of file
+        'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failures]
+    }
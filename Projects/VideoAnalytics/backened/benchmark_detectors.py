@@ -0,0 +1,103 @@
+# Benchmark detector backends on CPU
+# File: benchmark_detectors.py
+#
+# Usage:
+#   python benchmark_detectors.py --backends torch onnx --imgsz 640 480 320 --threads 4
+#   python benchmark_detectors.py --video ../videos/sample.mp4 --frames 200
+#
+# The ONNX model is exported from the PyTorch weights on first use.
+
+import argparse
+import os
+import time
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+from detectors import DetectorConfig, create_detector, export_onnx
+
+def load_frames(video_path: str, count: int) -> List[np.ndarray]:
+    """Read frames from a video, or generate noise frames if no video is given"""
+    if not video_path:
+        rng = np.random.default_rng(0)
+        return [rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8) for _ in range(count)]
+
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+
+    if not frames:
+        raise SystemExit(f"Could not read any frames from {video_path}")
+    return frames
+
+def benchmark(config: DetectorConfig, frames: List[np.ndarray], warmup: int) -> Dict[str, float]:
+    """Time predict() per frame and summarize latency"""
+    detector = create_detector(config)
+    detector.warmup(warmup)
+
+    latencies = []
+    total_detections = 0
+    for frame in frames:
+        start = time.perf_counter()
+        batch = detector.predict(frame)
+        latencies.append((time.perf_counter() - start) * 1000)
+        total_detections += len(batch)
+
+    latencies = np.array(latencies)
+    return {
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "fps": 1000.0 / float(latencies.mean()),
+        "detections_per_frame": total_detections / len(frames),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark object detection backends")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx"], choices=["torch", "onnx"])
+    parser.add_argument("--weights", default="yolov8n.pt", help="PyTorch weights; ONNX is exported from these")
+    parser.add_argument("--imgsz", nargs="+", type=int, default=[640, 480, 320])
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--conf", type=float, default=0.4)
+    parser.add_argument("--iou", type=float, default=0.45)
+    parser.add_argument("--provider", default="CPUExecutionProvider")
+    parser.add_argument("--video", default="", help="Optional video file; random frames otherwise")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5)
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.frames)
+    print(f"Benchmarking on {len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}\n")
+    print(f"{'backend':<8} {'imgsz':>6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'fps':>7} {'det/frame':>10}")
+
+    base_name = os.path.splitext(args.weights)[0]
+    for backend in args.backends:
+        for imgsz in args.imgsz:
+            weights = args.weights
+            if backend == "onnx":
+                # Static-shape exports are tied to one input size
+                weights = f"{base_name}_{imgsz}.onnx"
+                if not os.path.exists(weights):
+                    os.replace(export_onnx(args.weights, imgsz), weights)
+
+            config = DetectorConfig(
+                backend=backend,
+                weights=weights,
+                imgsz=imgsz,
+                num_threads=args.threads,
+                conf_threshold=args.conf,
+                iou_threshold=args.iou,
+                execution_provider=args.provider,
+            )
+            result = benchmark(config, frames, args.warmup)
+            print(f"{backend:<8} {imgsz:>6} {result['mean_ms']:>9.1f} {result['p50_ms']:>9.1f} "
+                  f"{result['p95_ms']:>9.1f} {result['fps']:>7.1f} {result['detections_per_frame']:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+# Pluggable object detection backends
+# File: detectors.py
+
+import ast
+import logging
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ===== CONFIGURATION =====
+
+@dataclass
+class DetectorConfig:
+    """Per-deployment inference settings"""
+    backend: str = "torch"          # torch, onnx
+    weights: str = "yolov8n.pt"     # .pt for torch, .onnx for onnx
+    imgsz: int = 640                # square network input size in pixels
+    num_threads: int = 0            # 0 = let the runtime decide
+    conf_threshold: float = 0.4
+    iou_threshold: float = 0.45     # NMS IoU threshold
+    max_detections: int = 300
+    execution_provider: str = "CPUExecutionProvider"  # or OpenVINOExecutionProvider
+
+    @classmethod
+    def from_env(cls) -> "DetectorConfig":
+        """Build a config from DETECTOR_* environment variables"""
+        defaults = cls()
+        backend = os.getenv("DETECTOR_BACKEND", defaults.backend).lower()
+        default_weights = "yolov8n.onnx" if backend == "onnx" else defaults.weights
+        return cls(
+            backend=backend,
+            weights=os.getenv("DETECTOR_WEIGHTS", default_weights),
+            imgsz=int(os.getenv("DETECTOR_IMGSZ", defaults.imgsz)),
+            num_threads=int(os.getenv("DETECTOR_THREADS", defaults.num_threads)),
+            conf_threshold=float(os.getenv("DETECTOR_CONF", defaults.conf_threshold)),
+            iou_threshold=float(os.getenv("DETECTOR_IOU", defaults.iou_threshold)),
+            max_detections=int(os.getenv("DETECTOR_MAX_DET", defaults.max_detections)),
+            execution_provider=os.getenv("DETECTOR_PROVIDER", defaults.execution_provider),
+        )
+
+# ===== RESULT CONTAINER =====
+
+@dataclass
+class DetectionBatch:
+    """Detections for one frame, kept as parallel NumPy arrays"""
+    boxes: np.ndarray      # (N, 4) float32, [x1, y1, x2, y2] in frame pixels
+    scores: np.ndarray     # (N,) float32
+    class_ids: np.ndarray  # (N,) int64
+
+    @classmethod
+    def empty(cls) -> "DetectionBatch":
+        return cls(
+            boxes=np.zeros((0, 4), dtype=np.float32),
+            scores=np.zeros((0,), dtype=np.float32),
+            class_ids=np.zeros((0,), dtype=np.int64),
+        )
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+# ===== ABSTRACT BASE CLASS =====
+
+class DetectorBackend(ABC):
+    """Abstract base class for object detection runtimes"""
+
+    def __init__(self, config: DetectorConfig):
+        self.config = config
+        self.names: Dict[int, str] = {}
+
+    @abstractmethod
+    def load(self) -> None:
+        """Load model weights and prepare the runtime"""
+        pass
+
+    @abstractmethod
+    def predict(self, frame: np.ndarray) -> DetectionBatch:
+        """Run inference on a BGR frame"""
+        pass
+
+    def warmup(self, runs: int = 2) -> None:
+        """Run a few dummy inferences so the first real request is not slow"""
+        dummy = np.zeros((self.config.imgsz, self.config.imgsz, 3), dtype=np.uint8)
+        for _ in range(runs):
+            self.predict(dummy)
+
+# ===== PYTORCH BACKEND =====
+
+class TorchDetector(DetectorBackend):
+    """Ultralytics YOLO running on PyTorch"""
+
+    def load(self) -> None:
+        import torch
+        from ultralytics import YOLO
+
+        if self.config.num_threads > 0:
+            torch.set_num_threads(self.config.num_threads)
+
+        self.model = YOLO(self.config.weights)
+        self.names = dict(self.model.names)
+        logger.info(f"Loaded PyTorch detector {self.config.weights} (imgsz={self.config.imgsz})")
+
+    def predict(self, frame: np.ndarray) -> DetectionBatch:
+        results = self.model.predict(
+            frame,
+            imgsz=self.config.imgsz,
+            conf=self.config.conf_threshold,
+            iou=self.config.iou_threshold,
+            max_det=self.config.max_detections,
+            verbose=False,
+        )
+        boxes = results[0].boxes
+        if boxes is None or len(boxes) == 0:
+            return DetectionBatch.empty()
+
+        return DetectionBatch(
+            boxes=boxes.xyxy.cpu().numpy().astype(np.float32, copy=False),
+            scores=boxes.conf.cpu().numpy().astype(np.float32, copy=False),
+            class_ids=boxes.cls.cpu().numpy().astype(np.int64),
+        )
+
+# ===== ONNX RUNTIME BACKEND =====
+
+class OnnxDetector(DetectorBackend):
+    """YOLOv8 exported to ONNX, running on ONNX Runtime (CPU or OpenVINO)"""
+
+    def load(self) -> None:
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if self.config.num_threads > 0:
+            options.intra_op_num_threads = self.config.num_threads
+            options.inter_op_num_threads = 1
+
+        providers = [self.config.execution_provider]
+        if self.config.execution_provider != "CPUExecutionProvider":
+            providers.append("CPUExecutionProvider")
+
+        self.session = ort.InferenceSession(self.config.weights, sess_options=options, providers=providers)
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+
+        # A statically exported model fixes the input size; respect it over the config
+        height, width = model_input.shape[2], model_input.shape[3]
+        if isinstance(height, int) and isinstance(width, int) and height != self.config.imgsz:
+            logger.warning(f"ONNX model was exported at {height}x{width}; ignoring imgsz={self.config.imgsz}")
+            self.config.imgsz = height
+
+        self.names = self._read_class_names()
+        logger.info(f"Loaded ONNX detector {self.config.weights} on {self.session.get_providers()}")
+
+    def _read_class_names(self) -> Dict[int, str]:
+        """Ultralytics stores the class map as a dict literal in the model metadata"""
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if "names" in metadata:
+            return {int(k): v for k, v in ast.literal_eval(metadata["names"]).items()}
+
+        num_classes = self.session.get_outputs()[0].shape[1] - 4
+        return {i: str(i) for i in range(num_classes)}
+
+    def _letterbox(self, frame: np.ndarray) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+        """Resize keeping aspect ratio and pad to a square network input"""
+        size = self.config.imgsz
+        height, width = frame.shape[:2]
+        scale = min(size / height, size / width)
+        new_w, new_h = int(round(width * scale)), int(round(height * scale))
+
+        resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+        padded = cv2.copyMakeBorder(
+            resized, pad_y, size - new_h - pad_y, pad_x, size - new_w - pad_x,
+            cv2.BORDER_CONSTANT, value=(114, 114, 114)
+        )
+        return padded, scale, (pad_x, pad_y)
+
+    def predict(self, frame: np.ndarray) -> DetectionBatch:
+        padded, scale, (pad_x, pad_y) = self._letterbox(frame)
+        # BGR -> RGB, HWC -> NCHW, scale to [0, 1] in one native call
+        blob = cv2.dnn.blobFromImage(padded, scalefactor=1 / 255.0, swapRB=True)
+
+        output = self.session.run(None, {self.input_name: blob})[0]
+        predictions = output[0].T  # (num_anchors, 4 + num_classes)
+
+        class_scores = predictions[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+
+        keep = scores >= self.config.conf_threshold
+        if not keep.any():
+            return DetectionBatch.empty()
+
+        predictions, scores, class_ids = predictions[keep], scores[keep], class_ids[keep]
+
+        # cx, cy, w, h in letterboxed space -> x1, y1, x2, y2 in frame space
+        boxes = np.empty((len(predictions), 4), dtype=np.float32)
+        half_w, half_h = predictions[:, 2] / 2, predictions[:, 3] / 2
+        boxes[:, 0] = (predictions[:, 0] - half_w - pad_x) / scale
+        boxes[:, 1] = (predictions[:, 1] - half_h - pad_y) / scale
+        boxes[:, 2] = (predictions[:, 0] + half_w - pad_x) / scale
+        boxes[:, 3] = (predictions[:, 1] + half_h - pad_y) / scale
+
+        height, width = frame.shape[:2]
+        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, width)
+        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, height)
+
+        indices = self._class_aware_nms(boxes, scores, class_ids)
+        return DetectionBatch(
+            boxes=boxes[indices],
+            scores=scores[indices].astype(np.float32, copy=False),
+            class_ids=class_ids[indices].astype(np.int64, copy=False),
+        )
+
+    def _class_aware_nms(self, boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray) -> np.ndarray:
+        """Offset boxes per class so a single NMS pass never suppresses across classes"""
+        # One past the largest coordinate keeps every class clear of the others at any frame size;
+        # float64 so large offsets do not cost the boxes their precision
+        offsets = class_ids.astype(np.float64)[:, None] * (float(boxes.max()) + 1.0)
+        shifted = boxes.astype(np.float64) + offsets
+        xywh = np.column_stack((shifted[:, :2], shifted[:, 2:] - shifted[:, :2]))
+
+        indices = cv2.dnn.NMSBoxes(
+            xywh.tolist(), scores.tolist(),
+            self.config.conf_threshold, self.config.iou_threshold,
+            top_k=self.config.max_detections
+        )
+        return np.asarray(indices, dtype=np.int64).reshape(-1)
+
+# ===== FACTORY =====
+
+BACKENDS = {
+    "torch": TorchDetector,
+    "onnx": OnnxDetector,
+}
+
+def create_detector(config: Optional[DetectorConfig] = None, load: bool = True) -> DetectorBackend:
+    """Instantiate (and by default load) the backend named in the config"""
+    config = config or DetectorConfig.from_env()
+    if config.backend not in BACKENDS:
+        raise ValueError(f"Unknown detector backend '{config.backend}'. Choose from: {', '.join(BACKENDS)}")
+
+    detector = BACKENDS[config.backend](config)
+    if load:
+        detector.load()
+    return detector
+
+def export_onnx(weights: str = "yolov8n.pt", imgsz: int = 640) -> str:
+    """Export PyTorch YOLO weights to a static-shape ONNX model for OnnxDetector"""
+    from ultralytics import YOLO
+
+    path = YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=False, simplify=True)
+    logger.info(f"Exported {weights} to {path}")
+    return str(path)
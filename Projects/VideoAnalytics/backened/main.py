@@ -1,43 +1,48 @@
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, Query
 import cv2
 import numpy as np
-from ultralytics import YOLO
+
+from detectors import create_detector, DetectorConfig
+from postprocess import build_label_table, format_detections, render_json
 
 app = FastAPI()
 
-# Load the YOLOv8 model once on startup
-model = YOLO("yolov8n.pt")  # 'n' = nano (smallest and fastest)
+# Load the detector once on startup. Backend, weights, input size, threads and
+# thresholds come from DETECTOR_* environment variables (see detectors.py).
+config = DetectorConfig.from_env()
+detector = create_detector(config)
+detector.warmup()
+label_table = build_label_table(detector.names)
 
 @app.get("/")
 def read_root():
-    return {"message": "Smart Surveillance API running with YOLOv8"}
+    return {
+        "message": "Smart Surveillance API running with YOLOv8",
+        "backend": config.backend,
+        "imgsz": config.imgsz
+    }
 
 @app.post("/detect")
-async def detect(file: UploadFile = File(...)):
+async def detect(
+    file: UploadFile = File(...),
+    min_confidence: float = Query(0.0, ge=0.0, le=1.0),
+    format: str = Query("records", pattern="^(records|columnar)$")
+):
     try:
         # Read the uploaded image
         contents = await file.read()
         nparr = np.frombuffer(contents, np.uint8)
         frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
 
-        # Run inference with YOLOv8
-        results = model.predict(frame, conf=0.4)
-
-        detections = []
-        for box in results[0].boxes:
-            cls_id = int(box.cls[0])
-            label = model.names[cls_id]
-            conf = float(box.conf[0])
-            xyxy = list(map(int, box.xyxy[0].tolist()))  # [x1, y1, x2, y2]
+        if frame is None:
+            return render_json({"error": "Could not decode image"}, status_code=400)
 
-            detections.append({
-                "label": label,
-                "confidence": round(conf, 2),
-                "bbox": xyxy
-            })
+        # Run inference with the configured backend
+        batch = detector.predict(frame)
 
-        return JSONResponse(content={"detections": detections})
+        # Whole-array filtering and conversion; "columnar" returns parallel lists
+        content = format_detections(batch, label_table, min_confidence, columnar=(format == "columnar"))
+        return render_json(content)
 
     except Exception as e:
-        return JSONResponse(content={"error": str(e)}, status_code=500)
+        return render_json({"error": str(e)}, status_code=500)
\ No newline at end of file
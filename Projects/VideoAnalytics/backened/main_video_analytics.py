@@ -13,8 +13,11 @@ from queue import Queue
 import threading
 from collections import deque
 import logging
+import os
 from abc import ABC, abstractmethod
 
+from detectors import DetectorBackend, DetectorConfig, create_detector
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -81,7 +84,7 @@ class BaseAgent(ABC):
 class ObjectDetectionAgent(BaseAgent):
     """Agent responsible for detecting objects in video frames"""
     
-    def __init__(self):
+    def __init__(self, detector_config: Optional[DetectorConfig] = None):
         super().__init__("ObjectDetection")
         self.confidence_threshold = 0.5
         self.class_names = [
@@ -89,20 +92,23 @@ class ObjectDetectionAgent(BaseAgent):
             'train', 'truck', 'boat', 'traffic light', 'fire hydrant',
             'stop sign', 'parking meter', 'bench'
         ]
-        # Simulated model weights - in real implementation, load actual YOLO/DETR model
-        self.model_weights = None
+        # Without a detector config the agent falls back to simulated detections
+        self.detector_config = detector_config
+        self.detector: Optional[DetectorBackend] = None
     
     def initialize(self) -> bool:
         """Initialize YOLO or similar object detection model"""
         try:
-            # In a real implementation, you would load actual model weights:
-            # self.model = YOLO('yolov8n.pt') or similar
             logger.info(f"Initializing {self.name} agent...")
             
-            # Simulate model loading time
-            time.sleep(1)
+            if self.detector_config is not None:
+                self.confidence_threshold = self.detector_config.conf_threshold
+                self.detector = create_detector(self.detector_config)
+                self.detector.warmup()
+            else:
+                # Simulate model loading time
+                time.sleep(1)
             
-            # For demo purposes, we'll simulate detections
             self.is_initialized = True
             logger.info(f"{self.name} agent initialized successfully")
             return True
@@ -118,9 +124,10 @@ class ObjectDetectionAgent(BaseAgent):
         if not self.is_initialized:
             return {"error": "Agent not initialized", "detections": []}
         
-        # Simulate object detection processing
-        # In real implementation, this would be: results = self.model(frame)
-        detections = self._simulate_object_detection(frame, frame_id)
+        if self.detector is not None:
+            detections = self._run_object_detection(frame)
+        else:
+            detections = self._simulate_object_detection(frame, frame_id)
         
         processing_time = (time.time() - start_time) * 1000  # Convert to ms
         self.processing_times.append(processing_time)
@@ -131,6 +138,23 @@ class ObjectDetectionAgent(BaseAgent):
             "confidence_threshold": self.confidence_threshold
         }
     
+    def _run_object_detection(self, frame: np.ndarray) -> List[Detection]:
+        """Run the configured detector backend and convert boxes to (x, y, w, h)"""
+        batch = self.detector.predict(frame)
+        now = datetime.now()
+        
+        xyxy = batch.boxes.astype(int)
+        return [
+            Detection(
+                class_id=int(cls_id),
+                class_name=self.detector.names.get(int(cls_id), str(int(cls_id))),
+                confidence=float(score),
+                bbox=(int(x1), int(y1), int(x2 - x1), int(y2 - y1)),
+                timestamp=now
+            )
+            for (x1, y1, x2, y2), score, cls_id in zip(xyxy, batch.scores, batch.class_ids)
+        ]
+    
     def _simulate_object_detection(self, frame: np.ndarray, frame_id: int) -> List[Detection]:
         """Simulate object detection - replace with real model inference"""
         height, width = frame.shape[:2]
@@ -404,9 +428,9 @@ class AnomalyDetectionAgent(BaseAgent):
 class AgentCoordinator:
     """Coordinates multiple AI agents for collaborative video analysis"""
     
-    def __init__(self):
+    def __init__(self, detector_config: Optional[DetectorConfig] = None):
         self.agents = {
-            "object_detection": ObjectDetectionAgent(),
+            "object_detection": ObjectDetectionAgent(detector_config),
             "motion_analysis": MotionAnalysisAgent(),
             "anomaly_detection": AnomalyDetectionAgent()
         }
@@ -582,8 +606,8 @@ class AgentCoordinator:
 class VideoProcessor:
     """Main video processing pipeline"""
     
-    def __init__(self, max_buffer_size: int = 30):
-        self.coordinator = AgentCoordinator()
+    def __init__(self, max_buffer_size: int = 30, detector_config: Optional[DetectorConfig] = None):
+        self.coordinator = AgentCoordinator(detector_config)
         self.frame_buffer = Queue(maxsize=max_buffer_size)
         self.results_buffer = Queue(maxsize=100)
         self.is_running = False
@@ -721,8 +745,9 @@ def main():
     """Main application entry point"""
     logger.info("=== Real-Time Video Analytics with Collaborative Agents ===")
     
-    # Create video processor
-    processor = VideoProcessor()
+    # Create video processor (set DETECTOR_BACKEND to use a real model instead of the simulation)
+    detector_config = DetectorConfig.from_env() if os.getenv("DETECTOR_BACKEND") else None
+    processor = VideoProcessor(detector_config=detector_config)
     
     # Initialize system
     if not processor.initialize():
@@ -0,0 +1,58 @@
+# Bulk post-processing and serialization of detector output
+# File: postprocess.py
+
+from typing import Any, Dict
+
+import numpy as np
+from fastapi.responses import JSONResponse, Response
+
+from detectors import DetectionBatch
+
+# orjson is optional; fall back to the stdlib encoder behind JSONResponse
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def build_label_table(names: Dict[int, str]) -> np.ndarray:
+    """Array indexed by class id so labels can be looked up for every box at once"""
+    size = max(names) + 1 if names else 0
+    table = np.array([str(i) for i in range(size)], dtype=object)
+    for class_id, name in names.items():
+        table[class_id] = name
+    return table
+
+def format_detections(batch: DetectionBatch, label_table: np.ndarray,
+                      min_confidence: float = 0.0, columnar: bool = False) -> Dict[str, Any]:
+    """Filter, round and convert a whole batch with a handful of array operations"""
+    keep = batch.scores >= min_confidence
+    class_ids = batch.class_ids[keep]
+
+    if len(class_ids) and class_ids.max() >= len(label_table):
+        # Ids outside the table fall back to their numeric label
+        labels = [str(i) if i >= len(label_table) else label_table[i] for i in class_ids.tolist()]
+    else:
+        labels = label_table[class_ids].tolist()
+    confidences = np.round(batch.scores[keep].astype(np.float64), 2).tolist()
+    boxes = batch.boxes[keep].astype(np.int32).tolist()  # [x1, y1, x2, y2], truncated like int()
+
+    if columnar:
+        return {
+            "count": len(labels),
+            "labels": labels,
+            "confidence": confidences,
+            "bbox": boxes
+        }
+
+    return {
+        "detections": [
+            {"label": label, "confidence": conf, "bbox": bbox}
+            for label, conf, bbox in zip(labels, confidences, boxes)
+        ]
+    }
+
+def render_json(content: Dict[str, Any], status_code: int = 200) -> Response:
+    """Serialize with orjson when installed"""
+    if orjson is not None:
+        return Response(content=orjson.dumps(content), status_code=status_code, media_type="application/json")
+    return JSONResponse(content=content, status_code=status_code)
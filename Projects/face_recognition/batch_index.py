@@ -0,0 +1,196 @@
+"""
+Offline face indexing and search over photo and video archives.
+
+    python batch_index.py index /archive/photos /archive/videos --store face_store --workers 8
+    python batch_index.py search --store face_store --person rico
+    python batch_index.py search --store face_store --image query.jpg
+
+Indexing walks the directories, encodes faces with a process pool and
+appends them to a FaceStore. Sources already in the store are skipped, so
+an interrupted run can be restarted; sources that could not be read are not
+recorded and are tried again on the next run. Search compares the query encodings
+against the memory-mapped store.
+"""
+import argparse
+import os
+import time
+from collections import defaultdict
+from multiprocessing import Pool
+
+import cv2
+import face_recognition
+import numpy as np
+
+from encoding_index import IMAGE_EXTENSIONS, EncodingIndex, encode_image
+from face_store import FaceStore
+
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".webm"}
+
+# Set in each worker by _init_worker
+_options = {}
+
+
+def find_sources(paths):
+    for root_path in paths:
+        if os.path.isfile(root_path):
+            yield os.path.abspath(root_path)
+            continue
+        for dirpath, dirnames, filenames in os.walk(root_path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                ext = os.path.splitext(filename)[1].lower()
+                if ext in IMAGE_EXTENSIONS or ext in VIDEO_EXTENSIONS:
+                    yield os.path.abspath(os.path.join(dirpath, filename))
+
+
+def _init_worker(model, video_stride, max_side):
+    # Parallelism comes from the process pool; keep OpenCV from oversubscribing cores
+    cv2.setNumThreads(1)
+    _options.update(model=model, video_stride=video_stride, max_side=max_side)
+
+
+def _encode_frame(frame, frame_number):
+    scale = 1.0
+    max_side = _options["max_side"]
+    if max_side and max(frame.shape[:2]) > max_side:
+        scale = max_side / max(frame.shape[:2])
+        frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    locations = face_recognition.face_locations(rgb, model=_options["model"])
+    if not locations:
+        return [], []
+
+    encodings = face_recognition.face_encodings(rgb, locations)
+    faces = [[frame_number] + [int(v / scale) for v in loc] for loc in locations]
+    return faces, encodings
+
+
+def encode_source(path):
+    """
+    Returns (path, faces, encodings, ok); ok is False when the source could
+    not be read, so it is left out of the store and retried on the next run
+    """
+    faces, encodings = [], []
+    try:
+        if os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS:
+            capture = cv2.VideoCapture(path)
+            if not capture.isOpened():
+                print(f"Could not open {path}")
+                return path, [], [], False
+            frame_number = 0
+            try:
+                # grab() only advances; frames between strides are never decoded
+                while capture.grab():
+                    if frame_number % _options["video_stride"] == 0:
+                        ret, frame = capture.retrieve()
+                        if not ret:
+                            # Truncated or corrupt video: leave it out so the next run retries it
+                            print(f"Could not decode frame {frame_number} of {path}")
+                            return path, [], [], False
+                        f, e = _encode_frame(frame, frame_number)
+                        faces += f
+                        encodings += e
+                    frame_number += 1
+            finally:
+                capture.release()
+        else:
+            img = cv2.imread(path)
+            if img is None:
+                print(f"Could not read {path}")
+                return path, [], [], False
+            faces, encodings = _encode_frame(img, 0)
+    except Exception as e:
+        print(f"Error encoding {path}: {e}")
+        return path, [], [], False
+    return path, faces, encodings, True
+
+
+def run_index(args):
+    store = FaceStore(args.store)
+    done = store.indexed_sources()
+    sources = [p for p in find_sources(args.paths) if p not in done]
+    print(f"{len(sources)} sources to index ({len(done)} already in {args.store}).")
+
+    start = time.perf_counter()
+    total_faces = 0
+    failed = 0
+    with Pool(args.workers, initializer=_init_worker,
+              initargs=(args.model, args.video_stride, args.max_side)) as pool:
+        for i, (path, faces, encodings, ok) in enumerate(pool.imap_unordered(encode_source, sources, chunksize=4), 1):
+            if ok:
+                store.append(path, faces, encodings)
+                total_faces += len(faces)
+            else:
+                failed += 1
+            if i % 100 == 0 or i == len(sources):
+                elapsed = time.perf_counter() - start
+                print(f"{i}/{len(sources)} sources, {total_faces} faces, {i / elapsed:.1f} sources/s")
+
+    print(f"Store now holds {len(store)} faces from {len(store.sources)} sources.")
+    if failed:
+        print(f"{failed} sources failed and will be retried on the next run.")
+
+
+def query_encodings(args):
+    if args.image:
+        encoding = encode_image(args.image)
+        if encoding is None:
+            raise SystemExit(f"No face found in {args.image}")
+        return np.array([encoding])
+
+    index = EncodingIndex(os.path.join(args.gallery, ".encoding_index.npz"))
+    index.load()
+    index.update(args.gallery)
+    encodings, names = index.known_faces()
+    selected = [i for i, name in enumerate(names) if name == args.person]
+    if not selected:
+        raise SystemExit(f"{args.person} is not in the gallery at {args.gallery}")
+    return encodings[selected]
+
+
+def run_search(args):
+    store = FaceStore(args.store)
+    start = time.perf_counter()
+    rows, distances = store.search(query_encodings(args), args.tolerance)
+    elapsed = time.perf_counter() - start
+
+    hits = np.asarray(store.faces()[rows]) if len(rows) else np.zeros((0, 6), dtype=np.int64)
+    by_source = defaultdict(list)
+    for (source_id, frame), distance in zip(hits[:, :2].tolist(), distances.tolist()):
+        by_source[store.sources[source_id]].append((frame, distance))
+
+    for source, hits in sorted(by_source.items()):
+        frames = ", ".join(f"{frame} ({distance:.2f})" for frame, distance in sorted(hits))
+        print(f"{source}: frames {frames}")
+    print(f"{len(rows)} matches in {len(by_source)} sources, searched {len(store)} faces in {elapsed * 1000:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch face indexing and search")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = subparsers.add_parser("index", help="Encode faces in photo and video directories")
+    index_parser.add_argument("paths", nargs="+")
+    index_parser.add_argument("--store", default="face_store")
+    index_parser.add_argument("--workers", type=int, default=os.cpu_count())
+    index_parser.add_argument("--model", default="hog", choices=["hog", "cnn"])
+    index_parser.add_argument("--video-stride", type=int, default=15, help="Encode every Nth video frame")
+    index_parser.add_argument("--max-side", type=int, default=1600, help="Downscale larger images before detection")
+    index_parser.set_defaults(func=run_index)
+
+    search_parser = subparsers.add_parser("search", help="Find every photo or frame containing a person")
+    query = search_parser.add_mutually_exclusive_group(required=True)
+    query.add_argument("--person", help="Name of a person in the gallery folder")
+    query.add_argument("--image", help="Photo of the person to look for")
+    search_parser.add_argument("--store", default="face_store")
+    search_parser.add_argument("--gallery", default="images/")
+    search_parser.add_argument("--tolerance", type=float, default=0.6)
+    search_parser.set_defaults(func=run_search)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Accuracy and latency of SimpleRecognition under different detector settings.
+
+    python benchmark_recognition.py --gallery images/ --test-dir test_images/
+
+test_images/ holds one folder per person, named like the gallery images
+(e.g. test_images/rico/*.jpg). A folder named "Unknown" holds people who
+are not in the gallery. Each test image should show one face.
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from encoding_index import IMAGE_EXTENSIONS
+from simple_recognition import SimpleRecognition
+
+SETTINGS = [
+    # label, SimpleRecognition options
+    ("hog fixed 0.25", dict(detector_model="hog")),
+    ("hog fixed 0.5", dict(detector_model="hog", frame_resizing=0.5)),
+    ("hog adaptive", dict(detector_model="hog", adaptive=True)),
+    ("hog adaptive, small encode", dict(detector_model="hog", adaptive=True, encode_full_resolution=False)),
+    ("cnn fixed 0.25", dict(detector_model="cnn")),
+    ("cnn adaptive", dict(detector_model="cnn", adaptive=True)),
+]
+
+
+def load_test_set(test_dir):
+    samples = []
+    for person in sorted(os.listdir(test_dir)):
+        person_dir = os.path.join(test_dir, person)
+        if not os.path.isdir(person_dir):
+            continue
+        for filename in sorted(os.listdir(person_dir)):
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                img = cv2.imread(os.path.join(person_dir, filename))
+                if img is not None:
+                    samples.append((person, img))
+    return samples
+
+
+def evaluate(sfr, samples):
+    latencies = []
+    found = correct = 0
+    for person, img in samples:
+        start = time.perf_counter()
+        _, names = sfr.detect_known_faces(img)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        if names:
+            found += 1
+            if person in names:
+                correct += 1
+
+    latencies = np.array(latencies)
+    return {
+        "recall": found / len(samples),
+        "accuracy": correct / len(samples),
+        "mean_ms": float(latencies.mean()),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark face detection settings")
+    parser.add_argument("--gallery", default="images/")
+    parser.add_argument("--test-dir", required=True)
+    parser.add_argument("--min-face-fraction", type=float, default=0.1)
+    parser.add_argument("--skip-cnn", action="store_true", help="Skip the slow cnn settings")
+    args = parser.parse_args()
+
+    samples = load_test_set(args.test_dir)
+    if not samples:
+        raise SystemExit(f"No test images found in {args.test_dir}")
+    print(f"{len(samples)} test images\n")
+    print(f"{'setting':<28} {'recall':>7} {'accuracy':>9} {'mean ms':>9} {'p95 ms':>9}")
+
+    for label, options in SETTINGS:
+        if args.skip_cnn and options["detector_model"] == "cnn":
+            continue
+
+        options = dict(options)
+        frame_resizing = options.pop("frame_resizing", None)
+        sfr = SimpleRecognition(min_face_fraction=args.min_face_fraction, **options)
+        if frame_resizing is not None:
+            sfr.frame_resizing = frame_resizing
+        sfr.load_encoding_images(args.gallery)
+
+        result = evaluate(sfr, samples)
+        print(f"{label:<28} {result['recall']:>7.1%} {result['accuracy']:>9.1%} "
+              f"{result['mean_ms']:>9.1f} {result['p95_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import hashlib
+import os
+
+import cv2
+import face_recognition
+import numpy as np
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+ENCODING_SIZE = 128
+
+
+def file_digest(path):
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def encode_image(img_path):
+    img = cv2.imread(img_path)
+    if img is None:
+        return None
+    rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    encodings = face_recognition.face_encodings(rgb_img)
+    if not encodings:
+        return None
+    return encodings[0]
+
+
+class EncodingIndex:
+    """
+    Face encodings for a gallery folder, persisted as a single .npz file.
+
+    Each image is keyed by filename and remembered with its size, mtime and
+    SHA-1, so on startup only new or changed images go through the encoder
+    and deleted images are dropped.
+    """
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.filenames = []
+        self.hashes = []
+        self.sizes = []
+        self.mtimes = []
+        self.has_face = np.zeros(0, dtype=bool)
+        self.encodings = np.zeros((0, ENCODING_SIZE), dtype=np.float64)
+
+    def load(self):
+        if not os.path.isfile(self.index_path):
+            return False
+
+        try:
+            with np.load(self.index_path, allow_pickle=False) as data:
+                self.filenames = data["filenames"].tolist()
+                self.hashes = data["hashes"].tolist()
+                self.sizes = data["sizes"].tolist()
+                self.mtimes = data["mtimes"].tolist()
+                self.has_face = data["has_face"]
+                self.encodings = data["encodings"]
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Ignoring unreadable encoding index {self.index_path}: {e}")
+            return False
+        return True
+
+    def save(self):
+        # Write to a temp file first so a crash never leaves a half-written index
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                filenames=np.array(self.filenames, dtype=str),
+                hashes=np.array(self.hashes, dtype=str),
+                sizes=np.array(self.sizes, dtype=np.int64),
+                mtimes=np.array(self.mtimes, dtype=np.float64),
+                has_face=self.has_face,
+                encodings=self.encodings,
+            )
+        os.replace(tmp_path, self.index_path)
+
+    def update(self, images_path):
+        existing = {filename: i for i, filename in enumerate(self.filenames)}
+        filenames, hashes, sizes, mtimes, has_face, encodings = [], [], [], [], [], []
+        added = changed = 0
+
+        for entry in sorted(os.scandir(images_path), key=lambda e: e.name):
+            if not entry.is_file() or entry.name.startswith("."):
+                continue
+            if os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+
+            stat = entry.stat()
+            i = existing.get(entry.name)
+
+            if i is not None and self.sizes[i] == stat.st_size and self.mtimes[i] == stat.st_mtime:
+                digest = self.hashes[i]
+            else:
+                digest = file_digest(entry.path)
+
+            if i is not None and self.hashes[i] == digest:
+                encoding, found = self.encodings[i], bool(self.has_face[i])
+            else:
+                print(f"Encoding {os.path.splitext(entry.name)[0]}")
+                encoding = encode_image(entry.path)
+                found = encoding is not None
+                if not found:
+                    print(f"No face found in {entry.name}, skipping")
+                    encoding = np.zeros(ENCODING_SIZE)
+                if i is None:
+                    added += 1
+                else:
+                    changed += 1
+
+            filenames.append(entry.name)
+            hashes.append(digest)
+            sizes.append(stat.st_size)
+            mtimes.append(stat.st_mtime)
+            has_face.append(found)
+            encodings.append(encoding)
+
+        removed = len(set(existing) - set(filenames))
+        stat_changed = sizes != self.sizes or mtimes != self.mtimes
+
+        self.filenames, self.hashes, self.sizes, self.mtimes = filenames, hashes, sizes, mtimes
+        self.has_face = np.array(has_face, dtype=bool)
+        self.encodings = np.array(encodings, dtype=np.float64).reshape(-1, ENCODING_SIZE)
+
+        if added or changed or removed or stat_changed:
+            self.save()
+        return added, changed, removed
+
+    def known_faces(self):
+        names = [os.path.splitext(f)[0] for f, found in zip(self.filenames, self.has_face) if found]
+        return self.encodings[self.has_face], names
@@ -0,0 +1,134 @@
+import numpy as np
+
+UNKNOWN = "Unknown"
+
+
+def squared_distances(queries, points, point_sq_norms):
+    # |q - p|^2 = |q|^2 + |p|^2 - 2 q.p, computed for every pair with one matmul
+    query_sq_norms = np.einsum("ij,ij->i", queries, queries)
+    d2 = query_sq_norms[:, None] + point_sq_norms[None, :] - 2.0 * (queries @ points.T)
+    return np.maximum(d2, 0.0, out=d2)
+
+
+class FaceMatcher:
+    """
+    Exact nearest-neighbour matching against a contiguous float32 gallery.
+
+    All faces in a frame are matched with a single distance computation,
+    using the same rule as face_recognition.compare_faces: the closest
+    known face wins if it is within `tolerance`.
+    """
+
+    def __init__(self, encodings, names, tolerance=0.6):
+        self.encodings = np.ascontiguousarray(np.asarray(encodings, dtype=np.float32).reshape(-1, 128))
+        self.names = list(names)
+        self.tolerance = tolerance
+        self.sq_norms = np.einsum("ij,ij->i", self.encodings, self.encodings)
+
+    def __len__(self):
+        return len(self.names)
+
+    def nearest(self, face_encodings):
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, 128)
+        d2 = squared_distances(queries, self.encodings, self.sq_norms)
+        best = d2.argmin(axis=1)
+        return best, np.sqrt(d2[np.arange(len(queries)), best])
+
+    def match(self, face_encodings):
+        if len(face_encodings) == 0:
+            return []
+        if len(self) == 0:
+            return [UNKNOWN] * len(face_encodings)
+
+        best, distances = self.nearest(face_encodings)
+        return [self.names[i] if d <= self.tolerance else UNKNOWN for i, d in zip(best.tolist(), distances.tolist())]
+
+
+class IVFFaceMatcher(FaceMatcher):
+    """
+    Approximate matching for large galleries with an inverted-file index.
+
+    The gallery is partitioned with k-means into `n_lists` cells, stored
+    contiguously cell by cell. A query is compared against the centroids,
+    then only against the members of its `n_probe` closest cells, so the
+    cost grows with the cell size rather than the gallery size.
+    """
+
+    def __init__(self, encodings, names, tolerance=0.6, n_lists=None, n_probe=8, iterations=10, seed=0):
+        super().__init__(encodings, names, tolerance)
+        if n_lists is None:
+            n_lists = int(np.sqrt(len(self)))
+        self.n_lists = max(1, min(n_lists, len(self)))
+        self.n_probe = max(1, min(n_probe, self.n_lists))
+
+        centroids = self._train(iterations, seed)
+        assignments = squared_distances(self.encodings, centroids, np.einsum("ij,ij->i", centroids, centroids)).argmin(axis=1)
+
+        # Cells no gallery face falls in (duplicate encodings, or centroids that only fit the
+        # training sample) would leave probes with nothing to compare against; drop them
+        counts = np.bincount(assignments, minlength=len(centroids))
+        kept = np.flatnonzero(counts)
+        if len(kept) < len(centroids):
+            remap = np.zeros(len(centroids), dtype=np.int64)
+            remap[kept] = np.arange(len(kept))
+            centroids, assignments = centroids[kept], remap[assignments]
+            self.n_lists = len(kept)
+            self.n_probe = min(self.n_probe, self.n_lists)
+
+        self.centroids = centroids
+        self.centroid_sq_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        order = np.argsort(assignments, kind="stable")
+        self.list_ids = order
+        self.list_encodings = np.ascontiguousarray(self.encodings[order])
+        self.list_sq_norms = self.sq_norms[order]
+        self.list_offsets = np.searchsorted(assignments[order], np.arange(self.n_lists + 1))
+
+    def _train(self, iterations, seed):
+        rng = np.random.default_rng(seed)
+        # k-means on a bounded sample keeps build time reasonable for huge galleries
+        sample_size = min(len(self), self.n_lists * 256)
+        sample = self.encodings[rng.choice(len(self), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, self.n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            d2 = squared_distances(sample, centroids, np.einsum("ij,ij->i", centroids, centroids))
+            assign = d2.argmin(axis=1)
+            counts = np.bincount(assign, minlength=self.n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+            # Re-seed empty cells with the sample points farthest from their centroids
+            empty = np.flatnonzero(~filled)
+            if len(empty):
+                farthest = np.argsort(d2[np.arange(sample_size), assign])[::-1][:len(empty)]
+                centroids[empty] = sample[farthest]
+        return centroids
+
+    def nearest(self, face_encodings):
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, 128)
+        centroid_d2 = squared_distances(queries, self.centroids, self.centroid_sq_norms)
+        probes = np.argpartition(centroid_d2, self.n_probe - 1, axis=1)[:, :self.n_probe]
+
+        best = np.empty(len(queries), dtype=np.int64)
+        distances = np.empty(len(queries), dtype=np.float32)
+        for q, cells in enumerate(probes):
+            candidates = np.concatenate([np.arange(self.list_offsets[c], self.list_offsets[c + 1]) for c in cells])
+            if len(candidates) == 0:
+                # Cannot happen with empty cells dropped, but never fail a match over it
+                exact_best, exact_distances = FaceMatcher.nearest(self, queries[q:q + 1])
+                best[q], distances[q] = exact_best[0], exact_distances[0]
+                continue
+            d2 = squared_distances(queries[q:q + 1], self.list_encodings[candidates], self.list_sq_norms[candidates])[0]
+            i = d2.argmin()
+            best[q] = self.list_ids[candidates[i]]
+            distances[q] = np.sqrt(d2[i])
+        return best, distances
+
+
+def build_matcher(encodings, names, tolerance=0.6, ann_min_gallery=20000, **ivf_options):
+    # Exact search is faster than the IVF overhead until the gallery is large
+    if ann_min_gallery is not None and len(names) >= ann_min_gallery:
+        return IVFFaceMatcher(encodings, names, tolerance, **ivf_options)
+    return FaceMatcher(encodings, names, tolerance)
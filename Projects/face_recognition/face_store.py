@@ -0,0 +1,107 @@
+import os
+
+import numpy as np
+
+from face_matcher import squared_distances
+
+ENCODING_SIZE = 128
+# source_id, frame, top, right, bottom, left
+META_COLUMNS = 6
+
+
+class FaceStore:
+    """
+    Append-only on-disk store of face encodings for offline corpora.
+
+    A store is a directory with three files:
+      encodings.f32  raw float32 rows of 128 values, read back with np.memmap
+      faces.i64      raw int64 rows of (source_id, frame, top, right, bottom, left)
+      sources.txt    one path per line; the line number is the source_id
+
+    A source's face rows are written before its path is added to
+    sources.txt, so after a crash any trailing rows for an unlisted source
+    are truncated and that source is simply indexed again.
+    """
+
+    def __init__(self, store_path):
+        self.store_path = store_path
+        self.encodings_path = os.path.join(store_path, "encodings.f32")
+        self.faces_path = os.path.join(store_path, "faces.i64")
+        self.sources_path = os.path.join(store_path, "sources.txt")
+
+        os.makedirs(store_path, exist_ok=True)
+        for path in (self.encodings_path, self.faces_path, self.sources_path):
+            if not os.path.exists(path):
+                open(path, "wb").close()
+
+        with open(self.sources_path, encoding="utf-8") as f:
+            self.sources = f.read().splitlines()
+        self._recover()
+
+    def _recover(self):
+        rows = min(os.path.getsize(self.encodings_path) // (ENCODING_SIZE * 4),
+                   os.path.getsize(self.faces_path) // (META_COLUMNS * 8))
+        if rows:
+            faces = np.memmap(self.faces_path, dtype=np.int64, mode="r", shape=(rows, META_COLUMNS))
+            # Rows are grouped by source in append order, so unlisted sources are all at the end
+            rows = int(np.searchsorted(faces[:, 0], len(self.sources)))
+            del faces
+
+        for path, row_size in ((self.encodings_path, ENCODING_SIZE * 4), (self.faces_path, META_COLUMNS * 8)):
+            if os.path.getsize(path) != rows * row_size:
+                with open(path, "r+b") as f:
+                    f.truncate(rows * row_size)
+        self.rows = rows
+
+    def __len__(self):
+        return self.rows
+
+    def indexed_sources(self):
+        return set(self.sources)
+
+    def append(self, source, faces, encodings):
+        source_id = len(self.sources)
+        faces = np.asarray(faces, dtype=np.int64).reshape(-1, META_COLUMNS - 1)
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+
+        meta = np.empty((len(faces), META_COLUMNS), dtype=np.int64)
+        meta[:, 0] = source_id
+        meta[:, 1:] = faces
+
+        with open(self.encodings_path, "ab") as f:
+            f.write(encodings.tobytes())
+        with open(self.faces_path, "ab") as f:
+            f.write(meta.tobytes())
+        with open(self.sources_path, "a", encoding="utf-8") as f:
+            f.write(source + "\n")
+
+        self.sources.append(source)
+        self.rows += len(faces)
+
+    def encodings(self):
+        if self.rows == 0:
+            return np.zeros((0, ENCODING_SIZE), dtype=np.float32)
+        return np.memmap(self.encodings_path, dtype=np.float32, mode="r", shape=(self.rows, ENCODING_SIZE))
+
+    def faces(self):
+        if self.rows == 0:
+            return np.zeros((0, META_COLUMNS), dtype=np.int64)
+        return np.memmap(self.faces_path, dtype=np.int64, mode="r", shape=(self.rows, META_COLUMNS))
+
+    def search(self, query_encodings, tolerance=0.6, chunk_rows=1 << 20):
+        """Return (row, distance) for every stored face within tolerance of any query"""
+        queries = np.asarray(query_encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+        encodings = self.encodings()
+        rows, distances = [], []
+
+        # Scan the memory-mapped matrix in chunks so memory stays bounded
+        for start in range(0, self.rows, chunk_rows):
+            chunk = np.asarray(encodings[start:start + chunk_rows])
+            d2 = squared_distances(queries, chunk, np.einsum("ij,ij->i", chunk, chunk)).min(axis=0)
+            hits = np.nonzero(d2 <= tolerance ** 2)[0]
+            rows.append(hits + start)
+            distances.append(np.sqrt(d2[hits]))
+
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return np.concatenate(rows), np.concatenate(distances)
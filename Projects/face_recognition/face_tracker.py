@@ -0,0 +1,112 @@
+import cv2
+import numpy as np
+
+
+class Track:
+    def __init__(self, location, name, points):
+        self.location = np.array(location, dtype=np.float32)  # top, right, bottom, left
+        self.name = name
+        self.points = points
+        self.initial_points = len(points)
+
+
+class FaceTracker:
+    """
+    Runs full detection + encoding only every `detect_every` frames, or as
+    soon as a track is lost. In between, each face box is moved with the
+    median Lucas-Kanade optical flow of corner points inside it, and keeps
+    the name it was given on the last detection frame.
+    """
+
+    def __init__(self, recognizer, detect_every=10, max_points=30, min_point_ratio=0.5):
+        self.recognizer = recognizer
+        self.detect_every = detect_every
+        self.max_points = max_points
+        self.min_point_ratio = min_point_ratio
+
+        self.tracks = []
+        self.prev_gray = None
+        self.frames_since_detect = 0
+        self.lost = False
+
+        self.frames = 0
+        self.detections = 0
+        self.encoder_calls = 0
+        self.encoder_calls_saved = 0
+
+    def process(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self.frames += 1
+
+        if self.prev_gray is None or self.lost or self.frames_since_detect >= self.detect_every:
+            self._detect(frame, gray)
+        else:
+            self._follow(gray)
+            self.frames_since_detect += 1
+
+        self.prev_gray = gray
+        locations = np.array([t.location for t in self.tracks]).reshape(-1, 4)
+        return locations.astype(int), [t.name for t in self.tracks]
+
+    def _detect(self, frame, gray):
+        face_locations, face_names = self.recognizer.detect_known_faces(frame)
+        self.detections += 1
+        self.encoder_calls += len(face_names)
+
+        self.tracks = [Track(loc, name, self._features(gray, loc)) for loc, name in zip(face_locations, face_names)]
+        self.frames_since_detect = 1
+        self.lost = False
+
+    def _features(self, gray, location):
+        top, right, bottom, left = [int(v) for v in location]
+        mask = np.zeros_like(gray)
+        mask[max(top, 0):max(bottom, 0), max(left, 0):max(right, 0)] = 255
+
+        points = cv2.goodFeaturesToTrack(gray, maxCorners=self.max_points, qualityLevel=0.01,
+                                         minDistance=3, mask=mask)
+        if points is None:
+            return np.zeros((0, 1, 2), dtype=np.float32)
+        return points
+
+    def _follow(self, gray):
+        # Faces that would have been re-encoded this frame
+        self.encoder_calls_saved += len(self.tracks)
+        if not self.tracks:
+            return
+
+        # One optical-flow call for the points of every track
+        counts = [len(t.points) for t in self.tracks]
+        if sum(counts) == 0:
+            self.lost = True
+            return
+        owners = np.repeat(np.arange(len(self.tracks)), counts)
+        prev_points = np.concatenate([t.points for t in self.tracks]).astype(np.float32)
+        next_points, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, prev_points, None,
+                                                          winSize=(15, 15), maxLevel=2)
+        status = status.reshape(-1).astype(bool)
+
+        height, width = gray.shape
+        kept = []
+        for i, track in enumerate(self.tracks):
+            good = status & (owners == i)
+            if good.sum() < max(3, self.min_point_ratio * track.initial_points):
+                self.lost = True
+                continue
+
+            dx, dy = np.median((next_points[good] - prev_points[good]).reshape(-1, 2), axis=0)
+            top, right, bottom, left = track.location
+            track.location = np.array([
+                np.clip(top + dy, 0, height), np.clip(right + dx, 0, width),
+                np.clip(bottom + dy, 0, height), np.clip(left + dx, 0, width)
+            ], dtype=np.float32)
+            track.points = next_points[good].reshape(-1, 1, 2)
+            kept.append(track)
+        self.tracks = kept
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "detections": self.detections,
+            "encoder_calls": self.encoder_calls,
+            "encoder_calls_saved": self.encoder_calls_saved,
+        }
@@ -1,28 +1,56 @@
+import time
+
 import cv2
 from simple_recognition import SimpleRecognition
+from face_tracker import FaceTracker
+from pipeline import LatestFrameCapture, RecognitionPool, StageTimer
 
 
 class Main:
-    def __init__(self, images_path="images/"):
-        self.sfr = SimpleRecognition()
+    def __init__(self, images_path="images/", detect_every=1, workers=0, detector_model="hog", adaptive=False):
+        self.sfr = SimpleRecognition(detector_model=detector_model, adaptive=adaptive)
         self.sfr.load_encoding_images(images_path)
+        # detect_every > 1 enables tracking: faces are re-identified every N frames
+        # or when a track is lost, and followed with optical flow in between
+        self.detect_every = detect_every
+        # workers > 0 enables the pipelined mode: capture, recognition and display
+        # run on separate threads
+        self.workers = workers
+
+    def draw(self, frame, face_locations, face_names):
+        for face_loc, name in zip(face_locations, face_names):
+            y1, x2, y2, x1 = face_loc
+            cv2.putText(frame, name, (x1, y1 - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 200, 200), 2)
+            cv2.rectangle(frame, (x1, y1), (x2, y2),
+                          (0, 200, 200), 4)
 
     def run(self):
+        if self.workers > 0:
+            return self.run_pipelined()
+
         capture = cv2.VideoCapture(0)
+        tracker = self.create_tracker()
+        last_time = time.perf_counter()
+        fps = 0.0
 
         while True:
             ret, frame = capture.read()
             if not ret:
                 break
 
-            face_locations, face_names = self.sfr.detect_known_faces(frame)
+            if tracker is None:
+                face_locations, face_names = self.sfr.detect_known_faces(frame)
+            else:
+                face_locations, face_names = tracker.process(frame)
 
-            for face_loc, name in zip(face_locations, face_names):
-                y1, x2, y2, x1 = face_loc
-                cv2.putText(frame, name, (x1, y1 - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 200, 200), 2)
-                cv2.rectangle(frame, (x1, y1), (x2, y2),
-                              (0, 200, 200), 4)
+            self.draw(frame, face_locations, face_names)
+
+            now = time.perf_counter()
+            fps = 0.9 * fps + 0.1 / max(now - last_time, 1e-6)
+            last_time = now
+            cv2.putText(frame, f"{fps:.1f} FPS", (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
 
             cv2.imshow("Frame", frame)
 
@@ -31,4 +59,64 @@ class Main:
                 break
 
         capture.release()
-        cv2.destroyAllWindows()
\ No newline at end of file
+        cv2.destroyAllWindows()
+
+        if tracker is not None:
+            self.print_tracker_stats(tracker)
+
+    def create_tracker(self):
+        return FaceTracker(self.sfr, self.detect_every) if self.detect_every > 1 else None
+
+    def print_tracker_stats(self, tracker):
+        stats = tracker.stats()
+        print(f"{stats['frames']} frames, {stats['detections']} detections, "
+              f"{stats['encoder_calls']} encoder calls, {stats['encoder_calls_saved']} encoder calls saved")
+
+    def run_pipelined(self):
+        tracker = self.create_tracker()
+        if tracker is not None and self.workers > 1:
+            print(f"Tracking runs on a single recognition worker; ignoring workers={self.workers}")
+
+        capture = LatestFrameCapture(0).start()
+        pool = RecognitionPool(self.sfr, capture, self.workers, tracker).start()
+        display_latency = StageTimer()
+        frame_id = 0
+
+        while capture.running:
+            frame_id, frame = capture.wait_newer(frame_id)
+            if frame is None:
+                continue
+
+            start = time.perf_counter()
+            result_id, face_locations, face_names = pool.latest()
+            display = frame.copy()
+            self.draw(display, face_locations, face_names)
+
+            stats = self.latency_stats(capture, pool, display_latency)
+            cv2.putText(display, f"capture {stats['capture']['mean_ms']}ms | "
+                                 f"recognition {stats['recognition']['mean_ms']}ms | "
+                                 f"results {frame_id - result_id} frames behind",
+                        (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            cv2.imshow("Frame", display)
+            display_latency.record(time.perf_counter() - start)
+
+            key = cv2.waitKey(1)
+            if key == 27:
+                break
+
+        pool.stop()
+        capture.stop()
+        cv2.destroyAllWindows()
+
+        if tracker is not None:
+            self.print_tracker_stats(tracker)
+        stats = self.latency_stats(capture, pool, display_latency)
+        print(stats)
+        return stats
+
+    def latency_stats(self, capture, pool, display_latency):
+        return {
+            "capture": capture.latency.summary(),
+            "recognition": pool.latency.summary(),
+            "display": display_latency.summary(),
+        }
@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+class StageTimer:
+    def __init__(self, maxlen=300):
+        self.samples = deque(maxlen=maxlen)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds * 1000)
+            self.count += 1
+
+    def summary(self):
+        with self.lock:
+            samples = np.array(self.samples)
+            count = self.count
+        if len(samples) == 0:
+            return {"count": count, "mean_ms": 0.0, "p95_ms": 0.0}
+        return {
+            "count": count,
+            "mean_ms": round(float(samples.mean()), 1),
+            "p95_ms": round(float(np.percentile(samples, 95)), 1),
+        }
+
+
+class LatestFrameCapture:
+    """
+    Reads the camera on its own thread and keeps only the newest frame, so
+    slow consumers never see a backlog of stale frames.
+    """
+
+    def __init__(self, source=0):
+        self.capture = cv2.VideoCapture(source)
+        self.condition = threading.Condition()
+        self.frame = None
+        self.frame_id = 0
+        self.running = False
+        self.latency = StageTimer()
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+
+    def start(self):
+        self.running = True
+        self.thread.start()
+        return self
+
+    def _loop(self):
+        while self.running:
+            start = time.perf_counter()
+            ret, frame = self.capture.read()
+            self.latency.record(time.perf_counter() - start)
+
+            with self.condition:
+                if not ret:
+                    self.running = False
+                else:
+                    self.frame = frame
+                    self.frame_id += 1
+                self.condition.notify_all()
+
+        self.capture.release()
+
+    def wait_newer(self, frame_id, timeout=1.0):
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame_id > frame_id or not self.running, timeout)
+            return self.frame_id, self.frame
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join(timeout=2.0)
+
+
+class RecognitionPool:
+    """
+    Worker threads that each grab the newest unclaimed frame and run
+    recognition on it. Results are published only if they are newer than
+    what is already there, so the display always draws the freshest answer.
+
+    With a FaceTracker, frames go through the tracker instead, on a single
+    worker since it follows faces from one processed frame to the next.
+    """
+
+    def __init__(self, recognizer, capture, workers=2, tracker=None):
+        self.recognizer = recognizer
+        self.capture = capture
+        self.tracker = tracker
+        if tracker is not None:
+            workers = 1
+        self.lock = threading.Lock()
+        self.claimed_id = 0
+        self.result = (0, np.zeros((0, 4), dtype=int), [])
+        self.latency = StageTimer()
+        self.running = False
+        self.threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+
+    def start(self):
+        self.running = True
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def _worker(self):
+        while self.running and self.capture.running:
+            frame_id, frame = self.capture.wait_newer(self.claimed_id, timeout=0.1)
+            with self.lock:
+                if frame is None or frame_id <= self.claimed_id:
+                    continue
+                self.claimed_id = frame_id
+
+            start = time.perf_counter()
+            if self.tracker is None:
+                face_locations, face_names = self.recognizer.detect_known_faces(frame)
+            else:
+                face_locations, face_names = self.tracker.process(frame)
+            self.latency.record(time.perf_counter() - start)
+
+            with self.lock:
+                if frame_id > self.result[0]:
+                    self.result = (frame_id, face_locations, face_names)
+
+    def latest(self):
+        with self.lock:
+            return self.result
+
+    def stop(self):
+        self.running = False
+        for thread in self.threads:
+            thread.join(timeout=2.0)
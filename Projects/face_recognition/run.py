@@ -1,4 +1,19 @@
-from app import main
+import argparse
 
-app = Main(images_path="images/")
-app.run()
\ No newline at end of file
+from main import Main
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--images", default="images/")
+parser.add_argument("--detect-every", type=int, default=1,
+                    help="Run face detection every N frames and track faces in between")
+parser.add_argument("--workers", type=int, default=0,
+                    help="Run capture, recognition and display on separate threads with N recognition workers")
+parser.add_argument("--model", default="hog", choices=["hog", "cnn"],
+                    help="Face detector model (cnn finds smaller faces but is much slower on CPU)")
+parser.add_argument("--adaptive", action="store_true",
+                    help="Pick the downscale factor from the frame size and encode faces at full resolution")
+args = parser.parse_args()
+
+app = Main(images_path=args.images, detect_every=args.detect_every, workers=args.workers,
+           detector_model=args.model, adaptive=args.adaptive)
+app.run()
@@ -3,48 +3,71 @@ import cv2
 import os
 import numpy as np
 
+from encoding_index import EncodingIndex
+from face_matcher import build_matcher
+
+# Smallest face (in pixels) each face_locations model finds reliably
+DETECTOR_MIN_FACE = {"hog": 80, "cnn": 40}
+
 class SimpleRecognition:
-    def __init__(self):
-        self.known_face_encodings = []
+    def __init__(self, tolerance=0.6, ann_min_gallery=20000, detector_model="hog",
+                 adaptive=False, min_face_fraction=0.1, encode_full_resolution=None):
+        if detector_model not in DETECTOR_MIN_FACE:
+            raise ValueError(f"detector_model must be one of {list(DETECTOR_MIN_FACE)}")
+
+        self.known_face_encodings = np.zeros((0, 128), dtype=np.float32)
         self.known_face_names = []
         self.frame_resizing = 0.25
+        self.tolerance = tolerance
+        self.detector_model = detector_model
+        # Adaptive mode picks the downscale per resolution so that a face min_face_fraction
+        # of the frame height still reaches the detector's minimum size
+        self.adaptive = adaptive
+        self.min_face_fraction = min_face_fraction
+        # Encode from the full-resolution frame instead of the downscaled one
+        self.encode_full_resolution = adaptive if encode_full_resolution is None else encode_full_resolution
+        self._adaptive_scales = {}
+        # Galleries at least this large use the approximate IVF index; None disables it
+        self.ann_min_gallery = ann_min_gallery
+        self.matcher = build_matcher(self.known_face_encodings, self.known_face_names, tolerance)
 
-    def load_encoding_images(self, images_path):
-        images_path = [os.path.join(images_path, f) for f in os.listdir(images_path) if os.path.isfile(os.path.join(images_path, f))]
-        print(f"{len(images_path)} encoding images found.")
+    def load_encoding_images(self, images_path, index_path=None):
+        if index_path is None:
+            index_path = os.path.join(images_path, ".encoding_index.npz")
 
-        for img_path in images_path:
-            img = cv2.imread(img_path)
-            rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        index = EncodingIndex(index_path)
+        index.load()
+        added, changed, removed = index.update(images_path)
 
-            basename = os.path.basename(img_path)
-            (filename, _) = os.path.splitext(basename)
-            print(f"Encoding {filename}")
+        encodings, names = index.known_faces()
+        self.matcher = build_matcher(encodings, names, self.tolerance, self.ann_min_gallery)
+        self.known_face_encodings = self.matcher.encodings
+        self.known_face_names = self.matcher.names
+        print(f"{len(names)} known faces loaded ({added} new, {changed} changed, {removed} removed).")
 
-            img_encoding = face_recognition.face_encodings(rgb_img)[0]
+    def resize_factor(self, frame):
+        if not self.adaptive:
+            return self.frame_resizing
 
-            self.known_face_encodings.append(img_encoding)
-            self.known_face_names.append(filename)
+        shape = frame.shape[:2]
+        if shape not in self._adaptive_scales:
+            min_face = self.min_face_fraction * shape[0]
+            self._adaptive_scales[shape] = min(1.0, DETECTOR_MIN_FACE[self.detector_model] / min_face)
+        return self._adaptive_scales[shape]
 
     def detect_known_faces(self, frame):
-        small_frame = cv2.resize(frame, (0, 0), fx=self.frame_resizing, fy=self.frame_resizing)
+        scale = self.resize_factor(frame)
+        small_frame = frame if scale == 1.0 else cv2.resize(frame, (0, 0), fx=scale, fy=scale)
         rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
 
-        face_locations = face_recognition.face_locations(rgb_small_frame)
-        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
-
-        face_names = []
-        for face_encoding in face_encodings:
-            matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding)
-            name = "Unknown"
-
-            face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-            best_match_index = np.argmin(face_distances)
-            if matches[best_match_index]:
-                name = self.known_face_names[best_match_index]
+        small_locations = face_recognition.face_locations(rgb_small_frame, model=self.detector_model)
+        face_locations = (np.array(small_locations).reshape(-1, 4) / scale).astype(int)
 
-            face_names.append(name)
+        if self.encode_full_resolution and scale < 1.0 and small_locations:
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            face_encodings = face_recognition.face_encodings(rgb_frame, [tuple(loc) for loc in face_locations.tolist()])
+        else:
+            face_encodings = face_recognition.face_encodings(rgb_small_frame, small_locations)
 
-        face_locations = np.array(face_locations)
-        face_locations = face_locations / self.frame_resizing
-        return face_locations.astype(int), face_names
+        face_names = self.matcher.match(face_encodings)
+        return face_locations, face_names